@@ -1,7 +1,9 @@
 import os
-import csv
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
-from textstat import flesch_kincaid_grade, flesch_reading_ease, syllable_count
+import codecs
+import atexit
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, session
 import openai
 import json
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -11,7 +13,24 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Import CSV logger helpers
-from csv_logger import log_to_csv, log_project, register_user, validate_user
+from csv_logger import (
+    log_to_csv, log_project, register_user, validate_user, read_projects, read_project_logs
+)
+from text_metrics import (
+    METRIC_NAMES, annotate_text, calculate_text_metrics,
+    calculate_text_metrics_incremental, metrics_fingerprint, stream_text_metrics
+)
+from batch_metrics import analyze_texts
+from result_cache import ResultCache, content_key
+from single_flight import FlightAbandoned, SingleFlight
+from llm_output import StreamedStringField, extract_rewrite
+from llm_gateway import LLM_API_BASE, LLMUnavailableError, llm
+from rewrite_chunks import REWRITE_CHUNK_WORKERS, split_rewrite_chunks
+from target_solver import (
+    SOLVER_CANDIDATES, SOLVER_GRADE_TOLERANCE, SOLVER_MAX_CALLS, SOLVER_SCORE_TOLERANCE, solve_targets
+)
+from jobs import JobQueue
+from syllables import syllable_cache, SYLLABLE_CACHE_SNAPSHOT
 
 app = Flask(__name__)
 # In production, use a secure, random value for SECRET_KEY (e.g. via os.urandom)
@@ -20,110 +39,52 @@ app.secret_key = os.environ.get("FLASK_SECRET_KEY", "dev-secret-key")
 # --------------------------------------------------
 # Set the OpenAI API key from the environment
 # --------------------------------------------------
+# (not needed when LLM_API_BASE points the gateway at mock_llm_server.py)
 api_key = os.environ.get("OPENAI_API_KEY")
-if not api_key:
+if not api_key and not LLM_API_BASE:
     raise ValueError("No API key found! Please set the OPENAI_API_KEY environment variable.")
-openai.api_key = api_key
-
-
-
-def get_reading_ease_descriptor(reading_ease):
-    if reading_ease >= 90:
-        return "Very Easy (Easily understood by an 11-year-old, simple language)"
-    elif reading_ease >= 80:
-        return "Easy (Conversational English, good for younger audiences)"
-    elif reading_ease >= 70:
-        return "Fairly Easy (Standard reading level, easily understood by teenagers)"
-    elif reading_ease >= 60:
-        return "Standard (Plain English, suitable for most readers)"
-    elif reading_ease >= 50:
-        return "Fairly Difficult (Somewhat challenging, college-level text)"
-    elif reading_ease >= 30:
-        return "Difficult (Best for academics and professionals, complex text)"
-    else:
-        return "Very Difficult (Extremely complex, suitable for specialists)"
-
-
-def get_readability_descriptor(fk_grade):
-    if fk_grade <= 5:
-        return "Very Easy (5th grade or below, easily understood by an 11-year-old)"
-    elif fk_grade <= 8:
-        return "Easy (6th-8th grade, fairly easy to read)"
-    elif fk_grade <= 10:
-        return "Standard (9th-10th grade, moderately challenging)"
-    elif fk_grade <= 12:
-        return "Fairly Difficult (11th-12th grade, college level)"
-    elif fk_grade <= 15:
-        return "Difficult (College level, requires advanced reading skills)"
-    else:
-        return "Very Difficult (Postgraduate level, highly academic)"
-
-
-def calculate_text_metrics(text):
-    words = text.strip().split()
-    sentences = [s.strip() for s in text.split('.') if s.strip()]
-    letter_count = sum(c.isalpha() for c in text)
-    word_count = len(words)
-    sentence_count = len(sentences) if sentences else 1
-    avg_word_length = round(letter_count / word_count, 1) if word_count > 0 else 0
-    unique_word_count = len(set(w.lower() for w in words))
-    total_syllables = syllable_count(text)
-    avg_syllables_per_word = round(total_syllables / word_count, 1) if word_count > 0 else 0
-    words_three_syllables = sum(1 for w in words if syllable_count(w) == 3)
-    perc_words_three_syllables = round((words_three_syllables / word_count) * 100, 1) if word_count > 0 else 0
-    longest_sentence = max(sentences, key=lambda s: len(s.split())) if sentences else ""
-    paragraphs = [p for p in text.split("\n\n") if p.strip()]
-    paragraph_count = len(paragraphs) if paragraphs else 1
-    avg_speaking_time = round(word_count / 150, 1) if word_count > 0 else 0
-    avg_reading_time = round(word_count / 200, 1) if word_count > 0 else 0
-    avg_writing_time = round(word_count / 40, 1) if word_count > 0 else 0
-    avg_words_per_sentence = round(word_count / sentence_count, 1) if sentence_count > 0 else 0
-    avg_words_per_paragraph = round(word_count / paragraph_count, 1) if paragraph_count > 0 else 0
-    avg_sentences_per_paragraph = round(sentence_count / paragraph_count, 1) if paragraph_count > 0 else 0
-    avg_characters_per_word = round(letter_count / word_count, 1) if word_count > 0 else 0
-    words_more_than_4_syllables = sum(1 for w in words if syllable_count(w) > 4)
-    perc_words_more_than_4_syllables = round((words_more_than_4_syllables / word_count) * 100, 1) if word_count > 0 else 0
-    words_more_than_12_letters = sum(1 for w in words if len(w) > 12)
-    perc_words_more_than_12_letters = round((words_more_than_12_letters / word_count) * 100, 1) if word_count > 0 else 0
-    word_frequency = {}
-    for w in words:
-        wl = w.lower()
-        word_frequency[wl] = word_frequency.get(wl, 0) + 1
-    top_words = sorted(word_frequency.items(), key=lambda x: x[1], reverse=True)[:5]
-    flesch_kincaid = flesch_kincaid_grade(text)
-    reading_ease = flesch_reading_ease(text)
-    reading_time_minutes = round(word_count / 200, 2)
-    metrics = {
-        "letterCount": letter_count,
-        "sentenceCount": sentence_count,
-        "wordCount": word_count,
-        "uniqueWordCount": unique_word_count,
-        "totalSyllables": total_syllables,
-        "avgSyllablesPerWord": avg_syllables_per_word,
-        "wordsThreeSyllables": words_three_syllables,
-        "percWordsThreeSyllables": perc_words_three_syllables,
-        "longestSentence": longest_sentence,
-        "paragraphCount": paragraph_count,
-        "avgSpeakingTime": avg_speaking_time,
-        "avgReadingTime": avg_reading_time,
-        "avgWritingTime": avg_writing_time,
-        "avgWordsPerSentence": avg_words_per_sentence,
-        "avgWordsPerParagraph": avg_words_per_paragraph,
-        "avgSentencesPerParagraph": avg_sentences_per_paragraph,
-        "avgCharactersPerWord": avg_characters_per_word,
-        "wordsMoreThan4Syllables": words_more_than_4_syllables,
-        "percWordsMoreThan4Syllables": perc_words_more_than_4_syllables,
-        "wordsMoreThan12Letters": words_more_than_12_letters,
-        "percWordsMoreThan12Letters": perc_words_more_than_12_letters,
-        "topWords": top_words,
-        "fleschKincaid": flesch_kincaid,
-        "readabilityDescriptor": get_readability_descriptor(flesch_kincaid),
-        "readingEase": reading_ease,
-        "readingEaseDescriptor": get_reading_ease_descriptor(reading_ease),
-        "readingTime": reading_time_minutes,
-        "averageWordLength": avg_word_length
-    }
-    return metrics
+openai.api_key = api_key or "mock"
+
+# Upper bound on the number of texts accepted by /analyze/batch
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "500"))
+
+# Bytes read per step by /analyze/upload
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# /analyze results keyed by content hash; set ANALYZE_CACHE_DB to share them between workers
+analyze_cache = ResultCache(
+    "analyze_results",
+    int(os.environ.get("ANALYZE_CACHE_SIZE", "1024")),
+    os.environ.get("ANALYZE_CACHE_DB", ""),
+)
+
+# LLM rewrites keyed on the full request sent to the model. They cost seconds and
+# money each, so they persist on disk by default; REWRITE_CACHE_DB="" keeps them in memory.
+REWRITE_MODEL = "gpt-4-turbo"
+rewrite_cache = ResultCache(
+    "rewrite_results",
+    int(os.environ.get("REWRITE_CACHE_SIZE", "256")),
+    os.environ.get("REWRITE_CACHE_DB", "rewrite_cache.db"),
+    ttl=int(os.environ.get("REWRITE_CACHE_TTL", str(7 * 24 * 3600))),
+)
+
+# Identical rewrites (/modify, /modify/stream, jobs) that arrive while one is already
+# waiting on the model share its call
+rewrite_flight = SingleFlight()
+
+# /modify/jobs runs rewrites on a bounded pool so they don't hold request workers
+modify_jobs = JobQueue()
+# The analyzer page streams rewrites from /modify/stream, which (like /modify) keeps a
+# request worker for the whole rewrite: run threaded or async workers (gunicorn
+# --threads / gevent) so open streams can't starve /analyze. MODIFY_STREAM=0 sends
+# the page through /modify/jobs instead, trading progressive text for the bounded pool.
+MODIFY_STREAM = os.environ.get("MODIFY_STREAM", "1") == "1"
+
+# Warm the shared syllable cache from the last snapshot and refresh it on shutdown
+if SYLLABLE_CACHE_SNAPSHOT:
+    syllable_cache.load(SYLLABLE_CACHE_SNAPSHOT)
+    atexit.register(syllable_cache.dump, SYLLABLE_CACHE_SNAPSHOT)
+
 
 # --- Home Page ---
 @app.route('/')
@@ -135,7 +96,23 @@ def home():
 def analyzer():
     if 'user_email' not in session:
         return redirect(url_for('login'))
-    return render_template('index.html')
+    return render_template('index.html', stream_modify=MODIFY_STREAM)
+
+def parse_fields(values=None):
+    # Optional comma-separated subset of metrics, e.g. fields=fleschKincaid,wordCount
+    values = request.values if values is None else values
+    fields = sorted({f.strip() for f in values.get('fields', '').split(',') if f.strip()})
+    unknown = [f for f in fields if f not in METRIC_NAMES]
+    return fields, unknown
+
+def read_text_chunks(stream, chunk_size=UPLOAD_CHUNK_SIZE):
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            break
+        yield decoder.decode(data)
+    yield decoder.decode(b'', final=True)
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
@@ -144,81 +121,437 @@ def analyze():
     text = request.form.get('text', '')
     if not text.strip():
         return jsonify({"error": "Please provide some text to analyze."}), 400
-    metrics = calculate_text_metrics(text)
+    fields, unknown = parse_fields()
+    if unknown:
+        return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+    # The key is the text exactly as submitted: whitespace changes the paragraph and
+    # syllable counts, so it can't be normalized away
+    # annotate=1 adds offset-based sentence/word highlighting data
+    annotate = request.values.get('annotate', '').lower() in ('1', 'true', 'yes')
+    key_parts = [metrics_fingerprint(), text]
+    if fields:
+        key_parts.append(",".join(fields))
+    if annotate:
+        key_parts.append("annotate")
+    key = content_key(*key_parts)
+    if key in request.if_none_match:
+        response = app.response_class(status=304)
+        response.set_etag(key)
+        return response
+    metrics = analyze_cache.get(key)
+    if metrics is None:
+        if fields:
+            metrics = calculate_text_metrics(text, fields)
+        else:
+            metrics = calculate_text_metrics_incremental(text)
+        if annotate:
+            metrics["annotations"] = annotate_text(text)
+        analyze_cache.set(key, metrics)
+    response = jsonify(metrics)
+    response.set_etag(key)
+    return response
+
+@app.route('/analyze/upload', methods=['POST'])
+def analyze_upload():
+    # For documents too large to paste: the body (or a multipart 'file') is read and
+    # analyzed chunk by chunk, so memory stays flat whatever the document size. Any
+    # other body is the text itself, whatever its Content-Type (curl --data-binary
+    # @file sends application/x-www-form-urlencoded), so options come from the query
+    # string only: reading request.values would parse and consume such a body as a form.
+    if 'user_email' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    fields, unknown = parse_fields(request.args)
+    if unknown:
+        return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+    upload = request.files.get('file') if request.mimetype == 'multipart/form-data' else None
+    stream = upload.stream if upload is not None else request.stream
+    metrics = stream_text_metrics(read_text_chunks(stream), sorted(set(fields) | {"wordCount"}) if fields else None)
+    if not metrics["wordCount"]:
+        return jsonify({"error": "Please provide some text to analyze."}), 400
+    if fields and "wordCount" not in fields:
+        del metrics["wordCount"]
     return jsonify(metrics)
 
-@app.route('/modify', methods=['POST'])
-def modify_text():
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
     if 'user_email' not in session:
         return jsonify({"error": "Unauthorized"}), 401
-    data = request.get_json()
-    text = data.get('text', '')
-    target_score = int(data.get('target_score', 60))
-    target_grade = int(data.get('target_grade', 10))
-    target_read_time = int(data.get('target_read_time', 3))
-    chosen_platform = data.get('platform', 'General')
-    chosen_region = data.get('region', 'General')
-    chosen_education = data.get('education', 'General')
-    chosen_age = data.get('age', 'General')
-    if not text.strip():
-        return jsonify({"error": "Please provide some text to modify."}), 400
+    items = request.get_json(silent=True)
+    if isinstance(items, dict):
+        items = items.get('texts')
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Please provide a JSON array of texts to analyze."}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} texts can be analyzed per request."}), 400
+    ids = []
+    texts = []
+    for index, item in enumerate(items):
+        if isinstance(item, dict):
+            ids.append(item.get('id', index))
+            texts.append(item.get('text', ''))
+        else:
+            ids.append(index)
+            texts.append(item)
+    results = [dict(id=item_id, **result) for item_id, result in zip(ids, analyze_texts(texts))]
+    return jsonify({"results": results})
+
+def usable_reply(raw_text):
+    # Whether a reply yields a rewrite; refusals and empty or unreadable replies aren't
+    # cached, so the next request asks the model again instead of replaying them
+    return extract_rewrite(raw_text, record=False)[0] is not None
+
+def request_rewrite(cache_key, messages, user_email):
+    raw_text = llm.complete(messages, REWRITE_MODEL, max_tokens=1500, temperature=0.4, user=user_email)[0]
+    if usable_reply(raw_text):
+        rewrite_cache.set(cache_key, raw_text)
+    return raw_text
+
+def rewrite_request(params, text, target_read_time):
+    # The model request for one piece of the document: its messages and cache key
     prompt = (
         f"Adjust the following text to achieve:\n"
-        f"- Flesch-Kincaid score of {target_score}\n"
-        f"- Grade level of {target_grade}\n"
-        f"- Reading time of {target_read_time} minutes\n"
+        f"- Flesch-Kincaid score of {params['target_score']}\n"
+        f"- Grade level of {params['target_grade']}\n"
+        f"- Reading time of {target_read_time:g} minutes\n"
         f"- Appeal to a wide audience\n\n"
-        f"Platform context: {chosen_platform}\n"
-        f"Region context: {chosen_region}\n"
-        f"Education context: {chosen_education}\n"
-        f"Age context: {chosen_age}\n\n"
+        f"Platform context: {params['platform']}\n"
+        f"Region context: {params['region']}\n"
+        f"Education context: {params['education']}\n"
+        f"Age context: {params['age']}\n\n"
         f"You must always return NON-EMPTY 'modified_text'. "
         f"If no change is needed, just return the same text. Also provide at least one relevant SEO keyword.\n\n"
         f"Respond ONLY in VALID JSON with exactly two keys: 'modified_text' (the updated text) and 'keywords'. "
         f"No extra commentary. Keep the context of the content relevant.\n\n"
         f"Input:\n{text}"
     )
-    try:
-        resp = client.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=[
-                {"role": "system", "content": "You are an assistant that returns ONLY valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1500,
-            temperature=0.4
-        )
-        raw_text = resp.choices[0].message.content.strip()
-    except Exception as e:
-        return jsonify({"error": f"OpenAI API request failed: {str(e)}"}), 500
-    final_text = text
-    final_keywords = []
-    try:
-        parsed = json.loads(raw_text)
-        candidate = parsed.get("modified_text", "").strip()
-        if candidate:
-            final_text = candidate
-        final_keywords = parsed.get("keywords", [])
-    except json.JSONDecodeError:
-        pass
+    messages = [
+        {"role": "system", "content": "You are an assistant that returns ONLY valid JSON."},
+        {"role": "user", "content": prompt}
+    ]
+    # The prompt already spells out the text, targets and audience, so hashing what
+    # is sent to the model covers every input that changes the rewrite
+    cache_key = content_key(REWRITE_MODEL, 1500, 0.4, json.dumps(messages, sort_keys=True))
+    return {"text": text, "messages": messages, "cache_key": cache_key}
+
+def prepare_modify(data):
+    # Reads a /modify body into the rewrite parameters; returns (params, error)
+    params = {
+        "text": data.get('text', ''),
+        "target_score": int(data.get('target_score', 60)),
+        "target_grade": int(data.get('target_grade', 10)),
+        "target_read_time": int(data.get('target_read_time', 3)),
+        "platform": data.get('platform', 'General'),
+        "region": data.get('region', 'General'),
+        "education": data.get('education', 'General'),
+        "age": data.get('age', 'General'),
+        "annotate": bool(data.get('annotate', False)),
+        # "cache": "bypass" asks for a fresh variant; it still replaces the cached one
+        "bypass_cache": data.get('cache') == 'bypass',
+        # "solve": true iterates toward target_score/target_grade (see target_solver)
+        "solve": bool(data.get('solve', False)),
+    }
+    text = params["text"]
+    if not text.strip():
+        return None, "Please provide some text to modify."
+    # Documents over the token budget are rewritten as paragraph-aligned chunks, each
+    # with its share of the reading-time target; a chunk's separator is the whitespace
+    # that preceded it, put back between the rewritten chunks
+    pieces = split_rewrite_chunks(text)
+    if len(pieces) == 1:
+        params["chunks"] = [dict(rewrite_request(params, text, params["target_read_time"]), separator="")]
+    else:
+        total = sum(len(piece) for piece, _ in pieces)
+        params["chunks"] = [
+            dict(rewrite_request(params, piece, max(round(params["target_read_time"] * len(piece) / total, 1), 0.1)),
+                 separator=separator)
+            for piece, separator in pieces
+        ]
+    return params, None
+
+def request_candidates(messages, n, user_email):
+    return llm.complete(messages, REWRITE_MODEL, max_tokens=1500, temperature=0.7, n=n, user=user_email)
+
+def solve_chunk(chunk, params):
+    # Only the accepted candidate is cached, under a key that includes the solver settings
+    cache_key = content_key("solver", chunk["cache_key"], SOLVER_CANDIDATES, SOLVER_MAX_CALLS,
+                            SOLVER_SCORE_TOLERANCE, SOLVER_GRADE_TOLERANCE)
+    cached = None if params["bypass_cache"] else rewrite_cache.get(cache_key)
+    if cached is not None:
+        return cached["raw"], True, dict(cached["solver"], roundTrips=0, candidates=0, elapsed=0)
+
+    def solve():
+        complete = partial(request_candidates, user_email=params["user_email"])
+        best, stats = solve_targets(chunk["messages"], complete, parse_rewrite, chunk["text"],
+                                    params["target_score"], params["target_grade"])
+        result = {"raw": best["raw"] if best else "", "solver": stats}
+        if usable_reply(result["raw"]):
+            rewrite_cache.set(cache_key, result)
+        return result
+
+    result, shared = rewrite_flight.do(cache_key, solve)
+    return result["raw"], shared, result["solver"]
+
+def rewrite_chunk(chunk, params):
+    # Returns (raw_text, cached, solver_stats) for one chunk; solver_stats is None
+    # outside solver mode
+    if params["solve"]:
+        return solve_chunk(chunk, params)
+    cache_key = chunk["cache_key"]
+    raw_text = None if params["bypass_cache"] else rewrite_cache.get(cache_key)
+    if raw_text is not None:
+        return raw_text, True, None
+    raw_text, shared = rewrite_flight.do(
+        cache_key, lambda: request_rewrite(cache_key, chunk["messages"], params["user_email"]))
+    return raw_text, shared, None
+
+def merge_solver_stats(stats):
+    if not stats or stats[0] is None:
+        return None
+    return {
+        "roundTrips": sum(s["roundTrips"] for s in stats),
+        "candidates": sum(s["candidates"] for s in stats),
+        "withinTolerance": all(s["withinTolerance"] for s in stats),
+        "elapsed": max(s["elapsed"] for s in stats),
+    }
+
+def parse_rewrite(raw_text, fallback):
+    # Returns (modified_text, keywords); malformed replies are salvaged where possible
+    # and the original text stands in when nothing can be recovered
+    modified_text, keywords, _ = extract_rewrite(raw_text)
+    return modified_text or fallback, keywords
+
+def merge_keywords(keyword_lists):
+    merged = []
+    for keywords in keyword_lists:
+        for keyword in keywords if isinstance(keywords, list) else [keywords]:
+            if keyword not in merged:
+                merged.append(keyword)
+    return merged
+
+def finish_modify(params, final_text, final_keywords, cached, user_email, project_name, solver=None):
+    # Builds the /modify response for the rewritten text and logs it.
+    # "cached" is true whenever this request did not make its own model call.
     modified_metrics = calculate_text_metrics(final_text)
     response_data = {
-        "originalText": text,
+        "originalText": params["text"],
         "modifiedText": final_text,
         "keywords": final_keywords,
-        "targetScore": target_score,
-        "targetGrade": target_grade,
-        "targetReadTime": target_read_time,
+        "targetScore": params["target_score"],
+        "targetGrade": params["target_grade"],
+        "targetReadTime": params["target_read_time"],
         "modifiedMetrics": modified_metrics,
-        "chosenPlatform": chosen_platform,
-        "chosenRegion": chosen_region,
-        "chosenEducation": chosen_education,
-        "chosenAge": chosen_age,
-        "projectName": session.get("project_name", "Default Project"),
-        "userEmail": session.get("user_email")
+        "chosenPlatform": params["platform"],
+        "chosenRegion": params["region"],
+        "chosenEducation": params["education"],
+        "chosenAge": params["age"],
+        "projectName": project_name,
+        "userEmail": user_email,
+        "cached": cached
     }
+    if len(params["chunks"]) > 1:
+        response_data["chunkCount"] = len(params["chunks"])
+    if solver is not None:
+        # Round trips made for this response (0 when served from cache)
+        response_data["solver"] = solver
+    if params["annotate"]:
+        response_data["annotations"] = annotate_text(final_text)
     log_to_csv(response_data)
-    return jsonify(response_data)
+    return response_data
+
+def join_chunks(chunks, parsed):
+    # The rewritten chunks, each after the whitespace that preceded it in the input
+    return "".join(chunk["separator"] + text for chunk, (text, _) in zip(chunks, parsed))
+
+def run_modify(data, user_email, project_name):
+    # Shared by /modify and /modify/jobs; returns (response_data, http_status)
+    params, error = prepare_modify(data)
+    if error:
+        return {"error": error}, 400
+    params["user_email"] = user_email
+    chunks = params["chunks"]
+    try:
+        if len(chunks) == 1:
+            results = [rewrite_chunk(chunks[0], params)]
+        else:
+            with ThreadPoolExecutor(max_workers=min(REWRITE_CHUNK_WORKERS, len(chunks))) as pool:
+                results = list(pool.map(lambda chunk: rewrite_chunk(chunk, params), chunks))
+    except LLMUnavailableError as e:
+        return {"error": str(e)}, 503
+    except Exception as e:
+        return {"error": f"OpenAI API request failed: {str(e)}"}, 500
+    parsed = [parse_rewrite(raw_text, chunk["text"]) for chunk, (raw_text, _, _) in zip(chunks, results)]
+    final_text = join_chunks(chunks, parsed)
+    final_keywords = parsed[0][1] if len(parsed) == 1 else merge_keywords(keywords for _, keywords in parsed)
+    cached = all(chunk_cached for _, chunk_cached, _ in results)
+    solver = merge_solver_stats([stats for _, _, stats in results])
+    return finish_modify(params, final_text, final_keywords, cached, user_email, project_name, solver), 200
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_chunk(chunk, bypass_cache, user_email):
+    # Yields decoded modified_text pieces as the model writes them, then the
+    # (raw_text, cached) pair as the last item
+    cache_key = chunk["cache_key"]
+    raw_text = None if bypass_cache else rewrite_cache.get(cache_key)
+    if raw_text is not None:
+        yield raw_text, True
+        return
+    # An identical rewrite already in flight (streamed or not) is joined, and its
+    # result arrives as one piece; otherwise this stream leads and others join it
+    while True:
+        future, leader = rewrite_flight.claim(cache_key)
+        if leader:
+            break
+        try:
+            yield future.result(), True
+            return
+        except FlightAbandoned:
+            continue
+    try:
+        field = StreamedStringField("modified_text")
+        pieces = []
+        for piece in llm.stream(chunk["messages"], REWRITE_MODEL, max_tokens=1500, temperature=0.4, user=user_email):
+            pieces.append(piece)
+            delta = field.feed(piece)
+            if delta:
+                yield delta
+        raw_text = "".join(pieces).strip()
+        if usable_reply(raw_text):
+            rewrite_cache.set(cache_key, raw_text)
+    except GeneratorExit:
+        # The client disconnected mid-stream; whoever joined makes the call instead
+        rewrite_flight.finish(cache_key, error=FlightAbandoned())
+        raise
+    except BaseException as e:
+        rewrite_flight.finish(cache_key, error=e)
+        raise
+    rewrite_flight.finish(cache_key, raw_text)
+    yield raw_text, False
+
+def stream_modify(params, user_email, project_name):
+    # Yields SSE events: "delta" with each newly decoded piece of modified_text while
+    # the model is still writing, then "done" with the full /modify response
+    # (metrics, keywords, ...) or "error". Chunked documents (and solver mode, which
+    # has to score whole candidates) are rewritten in parallel and each chunk is sent
+    # as one delta, in document order, once it is ready.
+    params["user_email"] = user_email
+    chunks = params["chunks"]
+    solver = None
+    try:
+        if len(chunks) == 1 and not params["solve"]:
+            for item in stream_chunk(chunks[0], params["bypass_cache"], user_email):
+                if isinstance(item, str):
+                    yield sse_event("delta", {"text": item})
+                    continue
+                raw_text, cached = item
+                final_text, final_keywords = parse_rewrite(raw_text, params["text"])
+                if cached:
+                    yield sse_event("delta", {"text": final_text})
+        else:
+            parsed = []
+            stats = []
+            cached = True
+            pool = ThreadPoolExecutor(max_workers=min(REWRITE_CHUNK_WORKERS, len(chunks)))
+            try:
+                futures = [pool.submit(rewrite_chunk, chunk, params) for chunk in chunks]
+                for chunk, future in zip(chunks, futures):
+                    raw_text, chunk_cached, chunk_stats = future.result()
+                    cached = cached and chunk_cached
+                    stats.append(chunk_stats)
+                    parsed.append(parse_rewrite(raw_text, chunk["text"]))
+                    yield sse_event("delta", {"text": chunk["separator"] + parsed[-1][0]})
+            finally:
+                pool.shutdown(wait=False, cancel_futures=True)
+            final_text = join_chunks(chunks, parsed)
+            final_keywords = parsed[0][1] if len(parsed) == 1 else merge_keywords(keywords for _, keywords in parsed)
+            solver = merge_solver_stats(stats)
+    except LLMUnavailableError as e:
+        yield sse_event("error", {"error": str(e)})
+        return
+    except Exception as e:
+        yield sse_event("error", {"error": f"OpenAI API request failed: {str(e)}"})
+        return
+    yield sse_event("done", finish_modify(params, final_text, final_keywords, cached, user_email, project_name, solver))
+
+def queue_headers(user_email):
+    # Where a model call made now would wait: calls queued ahead of it across all users
+    # (fair order) and an estimate of the seconds before it starts
+    position, eta = llm.limiter.estimate(user_email)
+    return {'X-Queue-Position': str(position), 'X-Queue-ETA': str(eta)}
+
+@app.route('/modify', methods=['POST'])
+def modify_text():
+    if 'user_email' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    data = request.get_json()
+    headers = queue_headers(session.get("user_email"))
+    response_data, status = run_modify(data, session.get("user_email"), session.get("project_name", "Default Project"))
+    return jsonify(response_data), status, headers
+
+@app.route('/modify/stream', methods=['POST'])
+def modify_text_stream():
+    # Same body as /modify, answered as a text/event-stream
+    if 'user_email' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    data = request.get_json(silent=True)
+    params, error = prepare_modify(data if isinstance(data, dict) else {})
+    if error:
+        return jsonify({"error": error}), 400
+    events = stream_modify(params, session.get("user_email"), session.get("project_name", "Default Project"))
+    headers = queue_headers(session.get("user_email"))
+    headers.update({'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    return Response(events, mimetype='text/event-stream', headers=headers)
+
+@app.route('/modify/jobs', methods=['POST'])
+def submit_modify_job():
+    # Same body as /modify; answers 202 with a job id right away
+    if 'user_email' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not str(data.get('text', '')).strip():
+        return jsonify({"error": "Please provide some text to modify."}), 400
+    user_email = session.get("user_email")
+    job_id = modify_jobs.submit(user_email, run_modify, data, user_email,
+                                session.get("project_name", "Default Project"))
+    if job_id is None:
+        response = jsonify({"error": "Too many rewrites are in progress. Please try again shortly."})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    response = jsonify({"jobId": job_id, "status": "queued"})
+    response.headers['Location'] = url_for('modify_job_status', job_id=job_id)
+    response.headers.extend(queue_headers(user_email))
+    return response, 202
+
+def find_job(job_id):
+    job = modify_jobs.get(job_id)
+    if job is None or job["userEmail"].lower() != session.get("user_email", "").lower():
+        return None
+    return job
+
+@app.route('/modify/jobs/<job_id>', methods=['GET'])
+def modify_job_status(job_id):
+    if 'user_email' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    job = find_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    status = {"jobId": job["jobId"], "status": job["status"]}
+    if job["status"] in ("done", "failed"):
+        status["resultUrl"] = url_for('modify_job_result', job_id=job_id)
+    return jsonify(status)
+
+@app.route('/modify/jobs/<job_id>/result', methods=['GET'])
+def modify_job_result(job_id):
+    # The stored /modify response once the job has finished; 202 while it is still pending
+    if 'user_email' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    job = find_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    if job["result"] is None:
+        return jsonify({"jobId": job["jobId"], "status": job["status"]}), 202
+    return jsonify(job["result"]), job["httpStatus"]
 
 # --- Authentication Routes ---
 
@@ -259,13 +592,7 @@ def logout():
 def projects_view():
     if 'user_email' not in session:
         return redirect(url_for('login'))
-    projects = []
-    if os.path.exists("projects.csv"):
-        with open("projects.csv", newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                if row.get("User Email", "").lower() == session.get("user_email").lower():
-                    projects.append(row)
+    projects = read_projects(session.get("user_email"))
     return render_template('projects.html', projects=projects)
 
 @app.route('/new_project', methods=['POST'])
@@ -283,13 +610,7 @@ def new_project():
 def project_detail(project_name):
     if 'user_email' not in session:
         return redirect(url_for('login'))
-    logs = []
-    if os.path.exists("text_metrics_log.csv"):
-        with open("text_metrics_log.csv", newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                if row.get("Project Name", "Default Project") == project_name and row.get("User Email", "").lower() == session.get("user_email").lower():
-                    logs.append(row)
+    logs = read_project_logs(project_name, session.get("user_email"))
     return render_template('project_detail.html', project_name=project_name, logs=logs)
 
 @app.route('/about')
@@ -1,5 +1,4 @@
 import os
-import csv
 from flask import Flask, render_template, request, jsonify, redirect, url_for, session
 from textstat import flesch_kincaid_grade, flesch_reading_ease, syllable_count
 import openai
@@ -11,7 +10,10 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Import CSV logger helpers
-from csv_logger import log_to_csv, log_project, register_user, validate_user
+from csv_logger import (
+    log_to_csv, log_project, register_user, validate_user, read_projects, read_project_logs
+)
+from llm_gateway import llm
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "your-secret-key")  # Use a secure random key in production
@@ -174,16 +176,15 @@ def modify_text():
     )
 
     try:
-        resp = openai.ChatCompletion.create(
-            model="gpt-4-turbo",
-            messages=[
+        raw_text = llm.complete(
+            [
                 {"role": "system", "content": "You are an assistant that returns ONLY valid JSON."},
                 {"role": "user", "content": prompt}
             ],
+            "gpt-4-turbo",
             max_tokens=1500,
             temperature=0.4
-        )
-        raw_text = resp.choices[0].message.content.strip()
+        )[0]
     except Exception as e:
         return jsonify({"error": f"OpenAI API request failed: {str(e)}"}), 500
 
@@ -258,18 +259,11 @@ def logout():
 def projects_view():
     if 'user_email' not in session:
         return redirect(url_for('login'))
-    projects = []
-    # Read projects from projects.csv and filter by the logged-in user's email.
-    if os.path.exists("projects.csv"):
-        with open("projects.csv", newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                if row.get("User Email", "").lower() == session.get("user_email").lower():
-                    # Only include Timestamp and Project Name for main view.
-                    projects.append({
-                        "Timestamp": row.get("Timestamp", "N/A"),
-                        "Project Name": row.get("Project Name", "N/A")
-                    })
+    # Only include Timestamp and Project Name for main view.
+    projects = [
+        {"Timestamp": row.get("Timestamp", "N/A"), "Project Name": row.get("Project Name", "N/A")}
+        for row in read_projects(session.get("user_email"))
+    ]
     return render_template('projects.html', projects=projects)
 
 @app.route('/new_project', methods=['POST'])
@@ -287,14 +281,7 @@ def new_project():
 def project_detail(project_name):
     if 'user_email' not in session:
         return redirect(url_for('login'))
-    logs = []
-    if os.path.exists("text_metrics_log.csv"):
-        with open("text_metrics_log.csv", newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                if (row.get("Project Name", "Default Project") == project_name and
-                    row.get("User Email", "").lower() == session.get("user_email").lower()):
-                    logs.append(row)
+    logs = read_project_logs(project_name, session.get("user_email"))
     return render_template('project_detail.html', project_name=project_name, logs=logs)
 
 @app.route('/about')
@@ -0,0 +1,289 @@
+import os
+import math
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from textstat import syllable_count
+from syllables import PUNCTUATION_RE, normalize_word
+from text_metrics import (
+    TS_SENTENCE_RE, calculate_text_metrics, word_features,
+    get_readability_descriptor, get_reading_ease_descriptor
+)
+
+# Worker processes used by analyze_texts (defaults to one per CPU)
+ANALYZE_WORKERS = int(os.environ.get("ANALYZE_WORKERS", "0")) or os.cpu_count() or 1
+EMPTY_TEXT_ERROR = "Please provide some text to analyze."
+
+# Workers are started by a fork server (spawned where there isn't one), never forked
+# from the app process: its log writer, job and limiter threads may be holding locks
+# (the syllable cache's, logging's) that a forked child would inherit held forever
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def tokenize_batch(texts):
+    # Flattens N documents into NumPy arrays: one row per word (vocabulary id, doc id),
+    # per ' '-token, per '.'-sentence and per textstat sentence, plus a feature table
+    # per distinct word, so every count below is a gather plus a bincount.
+    vocab = {}
+    features = []  # (lower id, length, letters, syllables, lexical) per vocab id
+    lower_ids = {}
+    lowers = []
+    word_ids, word_counts = [], []
+    token_ids, token_counts = [], []
+    sentence_words, sentence_counts, sentence_pieces = [], [], []
+    ts_lexicon, ts_counts = [], []
+    paragraphs, syllable_guard = [], []
+
+    def add_word(word):
+        lower, syll, letters, is_lexical = word_features(word)
+        if lower not in lower_ids:
+            lower_ids[lower] = len(lowers)
+            lowers.append(lower)
+        vocab[word] = len(features)
+        features.append((lower_ids[lower], len(word), letters, syll, is_lexical))
+
+    def add_token(token):
+        # Empty or newline-joined ' '-token; only its syllables matter
+        vocab[token] = len(features)
+        features.append((-1, 0, 0, syllable_count(normalize_word(token)), False))
+
+    for text in texts:
+        words = text.split()
+        for word in set(words).difference(vocab):
+            add_word(word)
+        word_ids.extend(map(vocab.__getitem__, words))
+        word_counts.append(len(words))
+
+        tokens = text.split(' ')
+        for token in set(tokens).difference(vocab):
+            add_token(token)
+        token_ids.extend(map(vocab.__getitem__, tokens))
+        token_counts.append(len(tokens))
+        # textstat counts no syllables at all for punctuation-only text
+        syllable_guard.append(bool(text) and (len(words) != 1 or words[0] != text or
+                                              features[vocab[text]][4]))
+
+        pieces = text.split('.')
+        sentence_words.extend(len(piece.split()) for piece in pieces)
+        sentence_pieces.extend(pieces)
+        sentence_counts.append(len(pieces))
+
+        ts_pieces = TS_SENTENCE_RE.split(text)
+        ts_lexicon.extend(len(PUNCTUATION_RE.sub('', piece).split()) for piece in ts_pieces)
+        ts_counts.append(len(ts_pieces))
+
+        paragraphs.append(sum(1 for piece in text.split("\n\n") if not piece.isspace() and piece))
+
+    n = len(texts)
+    doc_range = np.arange(n)
+    features = np.array(features, dtype=np.int64).reshape(-1, 5)
+    word_ids = np.array(word_ids, dtype=np.int64)
+    token_ids = np.array(token_ids, dtype=np.int64)
+    return {
+        "count": n,
+        "lowers": lowers,
+        "wordLower": features[word_ids, 0],
+        "wordLength": features[word_ids, 1],
+        "wordLetters": features[word_ids, 2],
+        "wordSyllables": features[word_ids, 3],
+        "wordLexical": features[word_ids, 4].astype(bool),
+        "wordDoc": np.repeat(doc_range, word_counts),
+        "tokenSyllables": np.maximum(features[token_ids, 3], 1),
+        "tokenDoc": np.repeat(doc_range, token_counts),
+        "syllableGuard": np.array(syllable_guard, dtype=bool),
+        "sentenceWords": np.array(sentence_words, dtype=np.int64),
+        "sentenceDoc": np.repeat(doc_range, sentence_counts),
+        "sentenceStart": np.cumsum([0] + sentence_counts[:-1]).astype(np.int64),
+        "sentencePieces": sentence_pieces,
+        "tsLexicon": np.array(ts_lexicon, dtype=np.int64),
+        "tsDoc": np.repeat(doc_range, ts_counts),
+        "paragraphs": np.array(paragraphs, dtype=np.int64),
+    }
+
+
+def _per_doc(doc_ids, n, weights=None):
+    counts = np.bincount(doc_ids, weights=weights, minlength=n)
+    return counts.astype(np.int64) if weights is not None else counts
+
+
+def _legacy_round(values, points):
+    # Vectorized textstat.legacy_round; same float operations in the same order
+    p = 10 ** points
+    return np.floor(values * p + np.copysign(0.5, values)) / p
+
+
+def _top_words(arrays, n):
+    # Top five lowercase words per document by count, ties broken by first occurrence,
+    # which is what sorting the scalar path's insertion-ordered dict gives
+    lower_count = max(len(arrays["lowers"]), 1)
+    keys = arrays["wordDoc"] * lower_count + arrays["wordLower"]
+    unique, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    docs = unique // lower_count
+    order = np.lexsort((first, -counts, docs))
+    docs, unique, counts = docs[order], unique[order], counts[order]
+    group_start = np.searchsorted(docs, docs, side='left')
+    keep = np.arange(len(docs)) - group_start < 5
+    top = [[] for _ in range(n)]
+    for doc, key, count in zip(docs[keep].tolist(), unique[keep].tolist(), counts[keep].tolist()):
+        top[doc].append((arrays["lowers"][key % lower_count], count))
+    return top, np.bincount(docs, minlength=n)
+
+
+def _longest_sentences(arrays, n):
+    sentence_words = arrays["sentenceWords"]
+    starts = arrays["sentenceStart"]
+    longest_words = np.maximum.reduceat(sentence_words, starts) if len(sentence_words) else np.zeros(n, np.int64)
+    is_longest = sentence_words == longest_words[arrays["sentenceDoc"]]
+    candidates = np.flatnonzero(is_longest)
+    docs, first = np.unique(arrays["sentenceDoc"][candidates], return_index=True)
+    longest = [""] * n
+    for doc, index in zip(docs.tolist(), candidates[first].tolist()):
+        if longest_words[doc]:
+            longest[doc] = arrays["sentencePieces"][index].strip()
+    return longest
+
+
+def calculate_text_metrics_batch(texts):
+    # Same output as [calculate_text_metrics(t) for t in texts], with the counting,
+    # ratios, percentages and Flesch scores computed for all documents at once
+    texts = list(texts)
+    n = len(texts)
+    if not n:
+        return []
+    arrays = tokenize_batch(texts)
+    word_doc = arrays["wordDoc"]
+    syllables_per_word = arrays["wordSyllables"]
+
+    word_count = _per_doc(word_doc, n)
+    letter_count = _per_doc(word_doc, n, arrays["wordLetters"])
+    lexicon = _per_doc(word_doc[arrays["wordLexical"]], n)
+    three_syllables = _per_doc(word_doc[syllables_per_word == 3], n)
+    over_four_syllables = _per_doc(word_doc[syllables_per_word > 4], n)
+    over_twelve_letters = _per_doc(word_doc[arrays["wordLength"] > 12], n)
+    total_syllables = _per_doc(arrays["tokenDoc"], n, arrays["tokenSyllables"])
+    total_syllables[~arrays["syllableGuard"]] = 0
+    sentence_count = np.maximum(_per_doc(arrays["sentenceDoc"][arrays["sentenceWords"] > 0], n), 1)
+    paragraph_count = np.maximum(arrays["paragraphs"], 1)
+    ts_pieces = _per_doc(arrays["tsDoc"], n)
+    ts_ignored = _per_doc(arrays["tsDoc"][arrays["tsLexicon"] <= 2], n)
+    ts_sentences = np.maximum(ts_pieces - ts_ignored, 1)
+
+    safe_words = np.maximum(word_count, 1)
+    has_words = word_count > 0
+    letters_per_word = letter_count / safe_words
+    syllables_per_word_avg = total_syllables / safe_words
+    perc_three = (three_syllables / safe_words) * 100
+    perc_over_four = (over_four_syllables / safe_words) * 100
+    perc_over_twelve = (over_twelve_letters / safe_words) * 100
+    speaking_time = word_count / 150
+    reading_time = word_count / 200
+    writing_time = word_count / 40
+    words_per_sentence = word_count / sentence_count
+    words_per_paragraph = word_count / paragraph_count
+    sentences_per_paragraph = sentence_count / paragraph_count
+
+    sentence_length = _legacy_round(lexicon / ts_sentences, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ts_syllables_per_word = np.where(
+            lexicon > 0, _legacy_round(total_syllables / np.maximum(lexicon, 1), 1), 0.0)
+    flesch_kincaid = _legacy_round(0.39 * sentence_length + 11.8 * ts_syllables_per_word - 15.59, 1)
+    reading_ease = _legacy_round(206.835 - 1.015 * sentence_length - 84.6 * ts_syllables_per_word, 2)
+
+    top_words, unique_word_count = _top_words(arrays, n)
+    longest_sentence = _longest_sentences(arrays, n)
+
+    results = []
+    for i in range(n):
+        words = has_words[i]
+        fk = float(flesch_kincaid[i])
+        ease = float(reading_ease[i])
+        results.append({
+            "letterCount": int(letter_count[i]),
+            "sentenceCount": int(sentence_count[i]),
+            "wordCount": int(word_count[i]),
+            "uniqueWordCount": int(unique_word_count[i]),
+            "totalSyllables": int(total_syllables[i]),
+            "avgSyllablesPerWord": round(float(syllables_per_word_avg[i]), 1) if words else 0,
+            "wordsThreeSyllables": int(three_syllables[i]),
+            "percWordsThreeSyllables": round(float(perc_three[i]), 1) if words else 0,
+            "longestSentence": longest_sentence[i],
+            "paragraphCount": int(paragraph_count[i]),
+            "avgSpeakingTime": round(float(speaking_time[i]), 1) if words else 0,
+            "avgReadingTime": round(float(reading_time[i]), 1) if words else 0,
+            "avgWritingTime": round(float(writing_time[i]), 1) if words else 0,
+            "avgWordsPerSentence": round(float(words_per_sentence[i]), 1),
+            "avgWordsPerParagraph": round(float(words_per_paragraph[i]), 1),
+            "avgSentencesPerParagraph": round(float(sentences_per_paragraph[i]), 1),
+            "avgCharactersPerWord": round(float(letters_per_word[i]), 1) if words else 0,
+            "wordsMoreThan4Syllables": int(over_four_syllables[i]),
+            "percWordsMoreThan4Syllables": round(float(perc_over_four[i]), 1) if words else 0,
+            "wordsMoreThan12Letters": int(over_twelve_letters[i]),
+            "percWordsMoreThan12Letters": round(float(perc_over_twelve[i]), 1) if words else 0,
+            "topWords": top_words[i],
+            "fleschKincaid": fk,
+            "readabilityDescriptor": get_readability_descriptor(fk),
+            "readingEase": ease,
+            "readingEaseDescriptor": get_reading_ease_descriptor(ease),
+            "readingTime": round(float(reading_time[i]), 2),
+            "averageWordLength": round(float(letters_per_word[i]), 1) if words else 0
+        })
+    return results
+
+
+def analyze_chunk(texts):
+    # Runs in a worker process. Returns one {"metrics": ...} or {"error": ...} per
+    # text so a bad item never fails the rest of the batch.
+    results = [{"error": EMPTY_TEXT_ERROR} for _ in texts]
+    valid = [i for i, text in enumerate(texts) if isinstance(text, str) and text.strip()]
+    try:
+        for i, metrics in zip(valid, calculate_text_metrics_batch([texts[i] for i in valid])):
+            results[i] = {"metrics": metrics}
+    except Exception:
+        for i in valid:
+            try:
+                results[i] = {"metrics": calculate_text_metrics(texts[i])}
+            except Exception as e:
+                results[i] = {"error": f"Analysis failed: {str(e)}"}
+    return results
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=ANALYZE_WORKERS,
+                                        mp_context=multiprocessing.get_context(POOL_START_METHOD))
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def analyze_texts(texts):
+    # Spreads the texts over the process pool in contiguous chunks, results in input order
+    texts = list(texts)
+    chunk_size = max(1, math.ceil(len(texts) / (ANALYZE_WORKERS * 2)))
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    if len(chunks) <= 1 or ANALYZE_WORKERS <= 1:
+        return analyze_chunk(texts)
+    try:
+        results = []
+        for part in _get_pool().map(analyze_chunk, chunks):
+            results.extend(part)
+        return results
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); start a fresh pool next time and finish inline
+        _reset_pool()
+        return analyze_chunk(texts)
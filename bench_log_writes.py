@@ -0,0 +1,158 @@
+import os
+import csv
+import sys
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from collections import Counter
+
+# Stress test for concurrent appends to the CSV files, the way several gunicorn
+# workers with many threads each would make them:
+#
+#   python bench_log_writes.py --processes 8 --threads 16 --rows 50
+#
+# Runs in a scratch directory with the CSV backend. Every log row carries a digest
+# of its own text (with commas, quotes, newlines and non-ASCII mixed in), every
+# writer also logs projects, and all writers race to register the same emails.
+# Afterwards the files are parsed back and any torn, interleaved, missing or
+# duplicated row, repeated header or double registration is reported as a failure.
+
+NOISE = ['plain', 'comma, separated', 'a "quoted" word', 'line\nbreak', 'crlf\r\nline', 'ünïcødé ✓', "it's"]
+
+
+def payload(writer, index, rng):
+    parts = [f"writer {writer} row {index}"] + [rng.choice(NOISE) for _ in range(rng.randint(1, 40))]
+    text = " ".join(parts) + "x" * rng.randint(0, 6000)
+    return text, hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def writer_thread(writer, args, results):
+    import csv_logger
+    rng = random.Random(writer)
+    registered = []
+    for index in range(args.rows):
+        text, digest = payload(writer, index, rng)
+        csv_logger.log_to_csv({
+            "projectName": f"project-{writer}", "userEmail": f"writer{writer}@example.com",
+            "originalText": text, "modifiedText": digest, "keywords": [str(writer), str(index)],
+        })
+        if index % 10 == 0:
+            csv_logger.log_project(f"project-{writer}", f"writer{writer}@example.com")
+    for _ in range(args.register_attempts):
+        email = f"shared{rng.randrange(args.emails)}@example.com"
+        if csv_logger.register_user(email, "secret"):
+            registered.append(email)
+    results.extend(registered)
+
+
+def writer_process(process_index, args, queue):
+    os.chdir(args.dir)
+    results = []
+    threads = [threading.Thread(target=writer_thread, args=(process_index * args.threads + t, args, results))
+               for t in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    import csv_logger
+    csv_logger.log_writer.close()
+    queue.put(results)
+
+
+def verify(args, registrations):
+    import csv_logger
+    failures = []
+    writers = args.processes * args.threads
+
+    with open(csv_logger.CSV_FILE, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    if rows[0] != csv_logger.HEADERS:
+        failures.append("metrics log doesn't start with its header")
+    seen = Counter()
+    for number, row in enumerate(rows[1:], 2):
+        if row == csv_logger.HEADERS:
+            failures.append(f"metrics log: repeated header at record {number}")
+            continue
+        if len(row) != len(csv_logger.HEADERS):
+            failures.append(f"metrics log: record {number} has {len(row)} fields")
+            continue
+        text, digest = row[3], row[4]
+        if hashlib.sha1(text.encode('utf-8')).hexdigest() != digest:
+            failures.append(f"metrics log: record {number} doesn't match its digest")
+            continue
+        seen[(row[2], row[5])] += 1
+    expected = writers * args.rows
+    if sum(seen.values()) != expected:
+        failures.append(f"metrics log: {sum(seen.values())} good rows, expected {expected}")
+    failures.extend(f"metrics log: {key} written {count} times" for key, count in seen.items() if count > 1)
+    for writer in range(writers):
+        found = len(csv_logger.read_project_logs(f"project-{writer}", f"writer{writer}@example.com"))
+        if found != args.rows:
+            failures.append(f"index: project-{writer} has {found} rows, expected {args.rows}")
+
+    with open(csv_logger.PROJECTS_CSV, newline='', encoding='utf-8') as f:
+        projects = list(csv.reader(f))
+    bad = [row for row in projects[1:] if len(row) != len(csv_logger.PROJECT_HEADERS) or row[0] == "Timestamp"]
+    expected_projects = writers * len(range(0, args.rows, 10))
+    if projects[0] != csv_logger.PROJECT_HEADERS or bad or len(projects) - 1 != expected_projects:
+        failures.append(f"projects: {len(projects) - 1} rows ({len(bad)} bad), expected {expected_projects}")
+
+    if registrations:
+        with open(csv_logger.USERS_CSV, newline='', encoding='utf-8') as f:
+            users = Counter(row["Email"] for row in csv.DictReader(f))
+        failures.extend(f"users: {email} registered {count} times" for email, count in users.items() if count > 1)
+        failures.extend(f"users: {email} accepted {count} times" for email, count in Counter(registrations).items()
+                        if count > 1)
+        if set(users) != set(registrations):
+            failures.append("users: file and accepted registrations differ")
+    return failures, expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check concurrent CSV appends for torn or duplicated rows.")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=16, help="Writer threads per process")
+    parser.add_argument("--rows", type=int, default=50, help="Log rows per writer")
+    parser.add_argument("--emails", type=int, default=8, help="Distinct emails the writers race to register")
+    parser.add_argument("--register-attempts", type=int, default=1, help="Registrations per writer")
+    parser.add_argument("--async-log", action="store_true", help="Use the background log writer (LOG_ASYNC=1)")
+    parser.add_argument("--dir", default=None, help="Scratch directory (default: a new temporary one)")
+    args = parser.parse_args()
+    args.dir = os.path.abspath(args.dir or tempfile.mkdtemp(prefix="bench_log_writes_"))
+    os.makedirs(args.dir, exist_ok=True)
+    os.environ["LOG_BACKEND"] = "csv"
+    os.environ["LOG_ASYNC"] = "1" if args.async_log else "0"
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    queue = multiprocessing.Queue()
+    start = time.monotonic()
+    processes = [multiprocessing.Process(target=writer_process, args=(p, args, queue))
+                 for p in range(args.processes)]
+    for process in processes:
+        process.start()
+    registrations = [email for _ in processes for email in queue.get()]
+    for process in processes:
+        process.join()
+    elapsed = time.monotonic() - start
+    if any(process.exitcode for process in processes):
+        raise SystemExit("A writer process failed")
+
+    os.chdir(args.dir)
+    failures, expected = verify(args, registrations)
+    print(f"writers      {args.processes * args.threads} ({args.processes} processes x {args.threads} threads)")
+    print(f"log rows     {expected} in {elapsed:.2f}s ({expected / elapsed:.0f} rows/s)")
+    print(f"registered   {len(registrations)} of {args.emails} shared emails")
+    print(f"files in     {args.dir}")
+    if failures:
+        for failure in failures[:20]:
+            print("FAIL", failure)
+        raise SystemExit(f"{len(failures)} problems found")
+    print("OK: no torn, interleaved, missing or duplicated rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import time
+import argparse
+import threading
+import requests
+
+# Load test for the whole /modify path against a running app, e.g. with the model
+# stubbed out by mock_llm_server.py:
+#
+#   python mock_llm_server.py --latency-ms 800 --latency-dist lognormal &
+#   LLM_API_BASE=http://127.0.0.1:8001/v1 REWRITE_CACHE_DB= LLM_USER_RATE=600 LLM_USER_BURST=20 python app.py &
+#   python bench_modify.py --url http://127.0.0.1:5000 --concurrency 16 --requests 200
+#
+# Each request sends a distinct text with "cache": "bypass" unless --allow-cache is
+# given, so every request reaches the model. Each worker logs in as its own user
+# ("{n}" in --email is the worker number), and the per-user rate limit is raised above
+# what one worker sends, so the run measures the app rather than LLM_USER_RATE; a
+# fixed --email with the default limits measures the limiter instead.
+
+SAMPLE_TEXT = (
+    "Notwithstanding the considerable complexity of the methodology, the committee decided to "
+    "utilize additional resources, and subsequently it was able to demonstrate numerous improvements "
+    "regarding the objective. However, individuals who wished to obtain assistance found the process "
+    "comprehensive but slow."
+)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def login(session, base_url, email, password):
+    response = session.post(f"{base_url}/login", data={"email": email, "password": password},
+                            allow_redirects=False)
+    if response.status_code != 302:
+        response = session.post(f"{base_url}/register", data={"email": email, "password": password},
+                                allow_redirects=False)
+    if response.status_code != 302:
+        raise SystemExit(f"Could not log in as {email}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure /modify throughput and latency.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--endpoint", default="/modify", choices=["/modify", "/modify/stream"])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--email", default="bench{n}@example.com", help='"{n}" is replaced by the worker number')
+    parser.add_argument("--password", default="bench")
+    parser.add_argument("--allow-cache", action="store_true")
+    parser.add_argument("--solve", action="store_true")
+    args = parser.parse_args()
+
+    latencies = []
+    first_bytes = []
+    statuses = {}
+    lock = threading.Lock()
+    counter = iter(range(args.requests))
+
+    def worker(number):
+        session = requests.Session()
+        login(session, args.url, args.email.replace("{n}", str(number)), args.password)
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            body = {"text": f"{SAMPLE_TEXT} Request {index}.", "solve": args.solve}
+            if not args.allow_cache:
+                body["cache"] = "bypass"
+            start = time.perf_counter()
+            response = session.post(f"{args.url}{args.endpoint}", json=body, stream=True)
+            first = None
+            for _ in response.iter_content(chunk_size=None):
+                if first is None:
+                    first = time.perf_counter() - start
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                first_bytes.append(first if first is not None else elapsed)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    print(f"{len(latencies)} requests in {wall:.2f}s: {len(latencies) / wall:.2f} req/s, statuses {statuses}")
+    for label, values in (("latency", latencies), ("first byte", first_bytes)):
+        print(f"{label:>10}: p50 {percentile(values, 0.5) * 1000:.0f} ms, "
+              f"p95 {percentile(values, 0.95) * 1000:.0f} ms, p99 {percentile(values, 0.99) * 1000:.0f} ms, "
+              f"max {max(values, default=0) * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+import argparse
+from textstat import syllable_count
+from syllables import (
+    SYLLABLE_DICT_PATH, read_pronunciations, read_corpus_words, write_syllable_dictionary
+)
+
+
+def build(pronunciation_path, corpus_paths, out_path):
+    # Dictionary pronunciations win; logged corpus words missing from the dictionary
+    # get textstat's count baked in so lookups no longer depend on pyphen at runtime.
+    entries = read_pronunciations(pronunciation_path) if pronunciation_path else {}
+    for word in read_corpus_words(corpus_paths):
+        if word not in entries:
+            entries[word] = syllable_count(word)
+    return write_syllable_dictionary(entries, out_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compile the syllable dictionary used by text_metrics.")
+    parser.add_argument("--pronunciations", help="CMUdict-style pronunciation dictionary")
+    parser.add_argument("--corpus", nargs="*", default=["text_metrics_log.csv", "metrics_log_old.csv"],
+                        help="Logged CSVs whose texts should be covered")
+    parser.add_argument("--out", default=SYLLABLE_DICT_PATH)
+    args = parser.parse_args()
+    count = build(args.pronunciations, args.corpus, args.out)
+    print(f"Wrote {count} entries to {args.out}")
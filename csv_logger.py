@@ -1,12 +1,33 @@
+import io
 import os
 import csv
+import json
+import atexit
+import sqlite3
+import threading
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
+from file_lock import locked, append_bytes
+from log_index import LogIndex
+from log_writer import BatchedLogWriter
+from user_directory import UserDirectory
 
 CSV_FILE = 'text_metrics_log.csv'
 PROJECTS_CSV = 'projects.csv'
 USERS_CSV = 'registered_users.csv'
 
+# "csv" appends to the files above; "sqlite" keeps the metrics log and projects in
+# LOG_DB with indexed per-user lookups (existing CSV history is imported on first use,
+# after which the CSV files no longer receive rows)
+LOG_BACKEND = os.environ.get("LOG_BACKEND", "csv")
+LOG_DB = os.environ.get("LOG_DB", "text_metrics.db")
+# Metrics rows are written by a background thread in batches unless LOG_ASYNC=0;
+# LOG_FSYNC=1 makes each batch durable (fsync / synchronous=FULL) before it counts
+# as written. Project pages wait up to LOG_READ_WAIT seconds for queued rows.
+LOG_ASYNC = os.environ.get("LOG_ASYNC", "1") == "1"
+LOG_FSYNC = os.environ.get("LOG_FSYNC", "0") == "1"
+LOG_READ_WAIT = float(os.environ.get("LOG_READ_WAIT", "2"))
+
 # Updated headers: Removed 'Target Grade'
 HEADERS = [
     'Timestamp', 'Project Name', 'User Email', 'Original Text', 'Modified Text', 'Keywords',
@@ -20,8 +41,9 @@ HEADERS = [
     '% Words >4 Syllables', 'Words >12 Letters', '% Words >12 Letters',
     'Flesch-Kincaid', 'Reading Ease', 'Average Word Length'
 ]
+PROJECT_HEADERS = ['Timestamp', 'Project Name', 'User Email']
 
-def log_to_csv(data):
+def build_log_row(data):
     row = [
         datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         data.get("projectName", "Default Project"),
@@ -63,48 +85,190 @@ def log_to_csv(data):
         metrics.get("readingEase", ""),
         metrics.get("averageWordLength", "")
     ])
-    file_exists = os.path.exists(CSV_FILE)
-    with open(CSV_FILE, 'a', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        if not file_exists:
-            writer.writerow(HEADERS)
-        writer.writerow(row)
+    return row
+
+def format_csv_row(row):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    # A lone surrogate (e.g. half an emoji from a bad client) becomes "?" rather than
+    # failing the write
+    return buffer.getvalue().encode('utf-8', errors='replace')
+
+def append_csv_row(path, headers, row):
+    # Call with the file locked (see file_lock.locked)
+    append_bytes(path, format_csv_row(row), format_csv_row(headers))
+
+def _storable(value):
+    # As text SQLite accepts: lone surrogates become "?", as in format_csv_row
+    return "" if value is None else str(value).encode('utf-8', errors='replace').decode('utf-8')
+
+def read_csv_rows(path, predicate):
+    rows = []
+    if os.path.exists(path):
+        with locked(path, shared=True), open(path, newline='', encoding='utf-8') as csvfile:
+            for row in csv.DictReader(csvfile):
+                if predicate(row):
+                    rows.append(row)
+    return rows
+
+
+class SQLiteLogStore:
+    # Metrics log and projects in SQLite (WAL mode). Rows keep the CSV columns, stored
+    # as text like the CSV writer would, so pages render them the same way; the
+    # columns pages filter on are indexed, case-insensitively for emails.
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS metrics_log (id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, "
+                "project_name TEXT NOT NULL, user_email TEXT NOT NULL COLLATE NOCASE, row TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS metrics_log_lookup "
+                         "ON metrics_log (user_email, project_name, timestamp)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS projects (id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, "
+                "project_name TEXT NOT NULL, user_email TEXT NOT NULL COLLATE NOCASE)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS projects_lookup "
+                         "ON projects (user_email, project_name, timestamp)")
+            self._import_csv(conn)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=" + ("FULL" if LOG_FSYNC else "NORMAL"))
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _import_csv(self, conn):
+        # One-time copy of the CSV history into empty tables. The write lock is taken
+        # before checking, so workers starting together on a new database import once.
+        conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("SELECT 1 FROM metrics_log LIMIT 1").fetchone() is None:
+            rows = read_csv_rows(CSV_FILE, lambda row: True)
+            self._insert_logs(conn, [[row.get(header) or "" for header in HEADERS] for row in rows])
+        if conn.execute("SELECT 1 FROM projects LIMIT 1").fetchone() is None:
+            for row in read_csv_rows(PROJECTS_CSV, lambda row: True):
+                self._insert_project(conn, [row.get(header) or "" for header in PROJECT_HEADERS])
+
+    @staticmethod
+    def _insert_logs(conn, rows):
+        params = []
+        for row in rows:
+            values = [_storable(value) for value in row]
+            params.append((values[0], values[1], values[2], json.dumps(values)))
+        conn.executemany(
+            "INSERT INTO metrics_log (timestamp, project_name, user_email, row) VALUES (?, ?, ?, ?)", params
+        )
+
+    @staticmethod
+    def _insert_project(conn, row):
+        conn.execute("INSERT INTO projects (timestamp, project_name, user_email) VALUES (?, ?, ?)",
+                     tuple(_storable(value) for value in row))
+
+    def append_log(self, row):
+        self.append_logs([row])
+
+    def append_logs(self, rows):
+        # One transaction (one commit) for the whole batch
+        with self._connect() as conn:
+            self._insert_logs(conn, rows)
+
+    def append_project(self, row):
+        with self._connect() as conn:
+            self._insert_project(conn, row)
+
+    def read_projects(self, user_email):
+        rows = self._connect().execute(
+            "SELECT timestamp, project_name, user_email FROM projects WHERE user_email = ? ORDER BY id",
+            (user_email,),
+        ).fetchall()
+        return [dict(zip(PROJECT_HEADERS, row)) for row in rows]
+
+    def read_project_logs(self, project_name, user_email):
+        rows = self._connect().execute(
+            "SELECT row FROM metrics_log WHERE user_email = ? AND project_name = ? ORDER BY timestamp, id",
+            (user_email, project_name),
+        ).fetchall()
+        return [dict(zip(HEADERS, json.loads(row[0]))) for row in rows]
+
+
+_store = None
+_store_lock = threading.Lock()
+# With the CSV backend, the metrics log is appended and read through a byte-offset
+# sidecar index (text_metrics_log.csv.idx) keyed on (user email, project)
+log_index = LogIndex(CSV_FILE, HEADERS)
+
+def get_log_store():
+    # The SQLite store, opened on first use; None with the CSV backend
+    global _store
+    if LOG_BACKEND != "sqlite":
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = SQLiteLogStore(LOG_DB)
+    return _store
+
+def write_log_rows(rows):
+    store = get_log_store()
+    if store is not None:
+        store.append_logs(rows)
+    else:
+        log_index.append_many(rows, fsync=LOG_FSYNC)
+
+log_writer = BatchedLogWriter(write_log_rows)
+# Rows still queued at shutdown are written before the process exits
+atexit.register(log_writer.close, 10)
+
+def log_to_csv(data):
+    row = build_log_row(data)
+    if LOG_ASYNC:
+        log_writer.submit(row)
+    else:
+        write_log_rows([row])
 
 def log_project(project_name, user_email):
-    headers = ['Timestamp', 'Project Name', 'User Email']
     row = [datetime.now().strftime("%Y-%m-%d %H:%M:%S"), project_name, user_email]
-    file_exists = os.path.exists(PROJECTS_CSV)
-    with open(PROJECTS_CSV, 'a', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        if not file_exists:
-            writer.writerow(headers)
-        writer.writerow(row)
+    store = get_log_store()
+    if store is not None:
+        store.append_project(row)
+    else:
+        with locked(PROJECTS_CSV):
+            append_csv_row(PROJECTS_CSV, PROJECT_HEADERS, row)
+
+def read_projects(user_email):
+    # The user's projects, oldest first, as {column header: value} rows
+    store = get_log_store()
+    if store is not None:
+        return store.read_projects(user_email)
+    return read_csv_rows(PROJECTS_CSV, lambda row: row.get("User Email", "").lower() == user_email.lower())
+
+def read_project_logs(project_name, user_email):
+    # The user's logged rewrites for one project, oldest first (including rows this
+    # process has queued but not yet written)
+    log_writer.wait_idle(LOG_READ_WAIT)
+    store = get_log_store()
+    if store is not None:
+        return store.read_project_logs(project_name, user_email)
+    return log_index.lookup(user_email, project_name)
+
+# Logins and registrations check emails against an in-memory copy of USERS_CSV
+users = UserDirectory(USERS_CSV)
 
 def register_user(email, password):
-    file_exists = os.path.exists(USERS_CSV)
-    if file_exists:
-        with open(USERS_CSV, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                if row.get("Email", "").lower() == email.lower():
-                    return False  # User already exists
+    if users.get_hashes(email):
+        return False  # User already exists
     headers = ["Timestamp", "Email", "Password"]
     hashed = generate_password_hash(password)
     row = [datetime.now().strftime("%Y-%m-%d %H:%M:%S"), email, hashed]
-    with open(USERS_CSV, 'a', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        if not file_exists:
-            writer.writerow(headers)
-        writer.writerow(row)
-    return True
+    # Re-checked under the file lock, so two workers can't both register the same email
+    return users.add(email, hashed, lambda: append_csv_row(USERS_CSV, headers, row))
 
 def validate_user(email, password):
-    if os.path.exists(USERS_CSV):
-        with open(USERS_CSV, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                if row.get("Email", "").lower() == email.lower():
-                    stored_hash = row.get("Password", "")
-                    if check_password_hash(stored_hash, password):
-                        return True
-    return False
+    return any(check_password_hash(stored_hash, password) for stored_hash in users.get_hashes(email))
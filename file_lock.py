@@ -0,0 +1,59 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: locking is only between threads of one process
+    fcntl = None
+
+# Appends to the CSV files are serialised across processes (e.g. gunicorn workers)
+# with an advisory lock on a "<file>.lock" sidecar, and each append is a single
+# write() on an O_APPEND descriptor, so rows never interleave and the header is
+# written exactly once, by whichever writer finds the file empty.
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path):
+    with _thread_locks_guard:
+        lock = _thread_locks.get(path)
+        if lock is None:
+            lock = _thread_locks[path] = threading.Lock()
+        return lock
+
+
+@contextmanager
+def locked(path, shared=False):
+    # Exclusive (or shared, for readers) lock on `path` for the duration of the block
+    thread_lock = _thread_lock(os.path.abspath(path))
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def append_bytes(path, data, header=b"", fsync=False):
+    # Appends `data` (prefixed by `header` if the file is new or empty) in one write;
+    # call with the file locked. Returns the offset `data` starts at.
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        offset = os.fstat(fd).st_size
+        if offset == 0:
+            data = header + data
+            offset = len(header)
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        if fsync:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+    return offset
@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Rewrites running at once per process, and jobs allowed to wait behind them
+MODIFY_WORKERS = int(os.environ.get("MODIFY_WORKERS", "4"))
+MODIFY_QUEUE_SIZE = int(os.environ.get("MODIFY_QUEUE_SIZE", "32"))
+# Job records live here so any worker process can answer a poll and a finished
+# (paid for) rewrite survives a page reload or a restart
+MODIFY_JOBS_DB = os.environ.get("MODIFY_JOBS_DB", "modify_jobs.db")
+# Finished jobs are dropped after this many seconds
+MODIFY_JOB_TTL = int(os.environ.get("MODIFY_JOB_TTL", str(7 * 24 * 3600)))
+# A job still queued or running after this long was lost with the process running it
+MODIFY_JOB_TIMEOUT = int(os.environ.get("MODIFY_JOB_TIMEOUT", "600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueue:
+    # Bounded thread pool for slow, paid work (LLM rewrites). Every job is recorded in
+    # SQLite with its status and result; the function returns (result, http_status).
+
+    def __init__(self, db_path=MODIFY_JOBS_DB, workers=MODIFY_WORKERS, max_pending=MODIFY_QUEUE_SIZE,
+                 ttl=MODIFY_JOB_TTL, timeout=MODIFY_JOB_TIMEOUT):
+        self.db_path = db_path
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.timeout = timeout
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="modify-job")
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS modify_jobs (id TEXT PRIMARY KEY, user_email TEXT NOT NULL, "
+                "status TEXT NOT NULL, http_status INTEGER, result TEXT, "
+                "created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS modify_jobs_updated ON modify_jobs (updated)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def submit(self, user_email, fn, *args):
+        # Returns the new job id, or None when the queue is full
+        with self._lock:
+            if self._pending >= self.max_pending + self.workers:
+                return None
+            self._pending += 1
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO modify_jobs (id, user_email, status, created, updated) VALUES (?, ?, ?, ?, ?)",
+                (job_id, user_email, QUEUED, now, now),
+            )
+            conn.execute("DELETE FROM modify_jobs WHERE status IN (?, ?) AND updated < ?",
+                         (DONE, FAILED, now - self.ttl))
+        self._executor.submit(self._run, job_id, fn, args)
+        return job_id
+
+    def _run(self, job_id, fn, args):
+        try:
+            self._update(job_id, RUNNING)
+            try:
+                result, http_status = fn(*args)
+                status = DONE if http_status < 400 else FAILED
+            except Exception as e:
+                result, http_status, status = {"error": f"Job failed: {str(e)}"}, 500, FAILED
+            self._update(job_id, status, http_status, result)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _update(self, job_id, status, http_status=None, result=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE modify_jobs SET status = ?, http_status = ?, result = ?, updated = ? WHERE id = ?",
+                (status, http_status, json.dumps(result) if result is not None else None, time.time(), job_id),
+            )
+
+    def get(self, job_id):
+        row = self._connect().execute(
+            "SELECT id, user_email, status, http_status, result, created, updated FROM modify_jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        job = {
+            "jobId": row[0],
+            "userEmail": row[1],
+            "status": row[2],
+            "httpStatus": row[3],
+            "result": json.loads(row[4]) if row[4] is not None else None,
+            "created": row[5],
+            "updated": row[6],
+        }
+        if job["status"] in (QUEUED, RUNNING) and time.time() - job["updated"] > self.timeout:
+            job.update(status=FAILED, httpStatus=500,
+                       result={"error": "The server stopped before this job finished."})
+        return job
+
+    def stats(self):
+        with self._lock:
+            return {"pending": self._pending, "maxPending": self.max_pending}
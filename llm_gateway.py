@@ -0,0 +1,177 @@
+import os
+import time
+import random
+import threading
+from contextlib import contextmanager
+
+import openai
+import requests
+from openai import error as openai_error
+
+from llm_limiter import FairLimiter
+
+# Alternative API root, e.g. http://127.0.0.1:8001/v1 for mock_llm_server.py
+LLM_API_BASE = os.environ.get("LLM_API_BASE", "")
+# Seconds to connect and to wait for a response
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.environ.get("LLM_READ_TIMEOUT", "90"))
+# Keep-alive connections kept open to the provider
+LLM_POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", "16"))
+# Retries after the first attempt, with jittered exponential backoff between them
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", "8"))
+# Consecutive failed attempts that open the circuit, and how long it stays open
+LLM_BREAKER_THRESHOLD = int(os.environ.get("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN = float(os.environ.get("LLM_BREAKER_COOLDOWN", "30"))
+
+# Worth another attempt: rate limits, timeouts, dropped connections and 5xx
+RETRYABLE_ERRORS = (
+    openai_error.RateLimitError,
+    openai_error.Timeout,
+    openai_error.APIConnectionError,
+    openai_error.ServiceUnavailableError,
+    openai_error.TryAgain,
+)
+
+
+class LLMUnavailableError(Exception):
+    # Raised without calling the provider while the circuit is open, or when a call
+    # waited too long for its turn
+    def __init__(self, retry_after, reason="The language model is unavailable"):
+        super().__init__(f"{reason}; retry in {int(retry_after) + 1}s.")
+        self.retry_after = retry_after
+
+
+def is_retryable(e):
+    if isinstance(e, RETRYABLE_ERRORS):
+        return True
+    return isinstance(e, openai_error.APIError) and (e.http_status or 0) >= 500
+
+
+class CircuitBreaker:
+    # Closed: calls go through. After `threshold` consecutive failures it opens and
+    # rejects calls for `cooldown` seconds; then one trial call is let through
+    # (half-open) and its outcome closes or re-opens the circuit.
+
+    def __init__(self, threshold=LLM_BREAKER_THRESHOLD, cooldown=LLM_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining > 0 or self._trial:
+                raise LLMUnavailableError(max(remaining, 0))
+            self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if self._trial or time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+
+def backoff_delay(attempt, e=None):
+    # Full jitter: uniform in [0, base * 2^attempt], capped; a Retry-After header wins
+    retry_after = getattr(e, "headers", None) and e.headers.get("retry-after")
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+class LLMGateway:
+    # The one place the app talks to the provider: a shared keep-alive session,
+    # timeouts, retries with backoff and a circuit breaker around ChatCompletion.
+    # Every call is admitted by the fair limiter under the user it is made for.
+
+    def __init__(self, pool_size=LLM_POOL_SIZE, max_retries=LLM_MAX_RETRIES, api_base=LLM_API_BASE):
+        self.max_retries = max_retries
+        self.api_base = api_base
+        self.breaker = CircuitBreaker()
+        self.limiter = FairLimiter()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # openai 0.27 takes a Session here and uses it from every thread
+        openai.requestssession = self.session
+
+    def _create(self, **kwargs):
+        if self.api_base:
+            kwargs["api_base"] = self.api_base
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            self.breaker.before_call()
+            try:
+                response = openai.ChatCompletion.create(
+                    request_timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT), **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    # e.g. a 400: the provider is up, so this doesn't count against it
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                last_error = e
+                if attempt < self.max_retries:
+                    time.sleep(backoff_delay(attempt, e))
+                continue
+            self.breaker.record_success()
+            return response
+        raise last_error
+
+    @contextmanager
+    def _admitted(self, user):
+        # A call holds its slot through its retries, so a struggling provider also
+        # slows the rate new calls are sent at
+        try:
+            with self.limiter.slot(user):
+                yield
+        except TimeoutError:
+            raise LLMUnavailableError(self.limiter.avg_call_seconds, "Too many rewrites are queued") from None
+
+    def complete(self, messages, model, max_tokens, temperature, n=1, user=None):
+        # Returns the stripped text of each of the n choices
+        with self._admitted(user):
+            response = self._create(model=model, messages=messages, max_tokens=max_tokens,
+                                    temperature=temperature, n=n)
+        return [choice.message.content.strip() for choice in response.choices]
+
+    def stream(self, messages, model, max_tokens, temperature, user=None):
+        # Yields content pieces as they arrive. Only opening the stream is retried;
+        # an error part-way through reaches the caller.
+        with self._admitted(user):
+            for event in self._create(model=model, messages=messages, max_tokens=max_tokens,
+                                      temperature=temperature, stream=True):
+                piece = event.choices[0].delta.get("content") if event.choices else None
+                if piece:
+                    yield piece
+
+    def stats(self):
+        return dict(self.limiter.stats(), circuit=self.breaker.state(),
+                    consecutiveFailures=self.breaker.failures)
+
+
+llm = LLMGateway()
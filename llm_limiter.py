@@ -0,0 +1,150 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+# The limits below are enforced per process: each gunicorn worker has its own buckets
+# and cap, so with N workers a user can get up to N times LLM_USER_RATE and upstream
+# sees up to N times LLM_MAX_CONCURRENCY. Divide the settings by the worker count (or
+# run one worker with threads) when they must hold for the whole deployment.
+
+# Upstream calls in flight at once, across all users (per process)
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+# Per-user token bucket: sustained calls per minute and burst size
+LLM_USER_RATE = float(os.environ.get("LLM_USER_RATE", "20"))
+LLM_USER_BURST = float(os.environ.get("LLM_USER_BURST", "5"))
+# Longest a call waits in the queue before giving up
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", "120"))
+# Optional per-user shares of the queue, e.g. "team@example.com=3,batch@example.com=0.5"
+LLM_USER_WEIGHTS = os.environ.get("LLM_USER_WEIGHTS", "")
+
+
+def parse_weights(spec):
+    weights = {}
+    for item in spec.split(","):
+        user, _, weight = item.partition("=")
+        if user.strip() and weight.strip():
+            weights[user.strip().lower()] = float(weight)
+    return weights
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second, burst):
+        self.rate = rate_per_second
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now, tokens=1):
+        # Seconds until `tokens` tokens are available
+        self.refill(now)
+        missing = tokens - self.tokens
+        return max(missing / self.rate, 0) if self.rate > 0 else (0 if missing <= 0 else float("inf"))
+
+
+class FairLimiter:
+    # Admits upstream calls under a per-user token bucket and a global concurrency
+    # cap. Calls that can't go yet wait instead of failing, and waiting calls are
+    # admitted in weighted fair order (start-time fair queuing): each call gets a
+    # virtual tag of max(clock, the user's previous tag) + 1/weight and the lowest tag
+    # among users with a token goes next, so a heavy user queues behind their own
+    # backlog rather than in front of everyone else's.
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, rate_per_minute=LLM_USER_RATE,
+                 burst=LLM_USER_BURST, weights=None, timeout=LLM_QUEUE_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.weights = parse_weights(LLM_USER_WEIGHTS) if weights is None else weights
+        self.timeout = timeout
+        self.active = 0
+        self.clock = 0.0
+        # Moving average of how long a call holds its slot, for ETAs
+        self.avg_call_seconds = 5.0
+        self._buckets = {}
+        self._last_tags = {}
+        self._waiting = []
+        self._cond = threading.Condition()
+
+    def _bucket(self, user):
+        bucket = self._buckets.get(user)
+        if bucket is None:
+            bucket = self._buckets[user] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def _tag(self, user):
+        return max(self.clock, self._last_tags.get(user, 0.0)) + 1 / self.weights.get(user, 1.0)
+
+    def _next_waiter(self, now):
+        # Lowest-tagged waiter whose user has a token, or None
+        eligible = [w for w in self._waiting if self._bucket(w[1]).wait_time(now) == 0]
+        return min(eligible, default=None)
+
+    def estimate(self, user):
+        # (queue position, estimated seconds of waiting) for a call this user makes now
+        user = (user or "").lower()
+        with self._cond:
+            now = time.monotonic()
+            tag = self._tag(user)
+            ahead = sum(1 for w in self._waiting if w[0] < tag)
+            queued_for_user = sum(1 for w in self._waiting if w[1] == user)
+            bucket_wait = self._bucket(user).wait_time(now, queued_for_user + 1)
+            free_slots = self.max_concurrency - self.active
+            slot_wait = 0.0 if ahead < free_slots else \
+                (ahead - free_slots + 1) / self.max_concurrency * self.avg_call_seconds
+            return ahead, round(max(bucket_wait, slot_wait), 1)
+
+    @contextmanager
+    def slot(self, user):
+        # Holds one upstream slot for the duration of the block; raises TimeoutError
+        # if the call couldn't be admitted within the queue timeout
+        user = (user or "").lower()
+        with self._cond:
+            tag = self._tag(user)
+            self._last_tags[user] = tag
+            waiter = (tag, user, object())
+            self._waiting.append(waiter)
+            deadline = time.monotonic() + self.timeout
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self.active < self.max_concurrency and self._next_waiter(now) is waiter:
+                        break
+                    if now >= deadline:
+                        raise TimeoutError("Timed out waiting for an upstream slot")
+                    # Wake on releases, or when this user's next token is due
+                    self._cond.wait(min(deadline - now, max(self._bucket(user).wait_time(now), 0.05)))
+            finally:
+                self._waiting.remove(waiter)
+                self._cond.notify_all()
+            self._bucket(user).tokens -= 1
+            self.active += 1
+            self.clock = max(self.clock, tag)
+            self._prune(user)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                self.avg_call_seconds += 0.2 * (time.monotonic() - start - self.avg_call_seconds)
+                self._cond.notify_all()
+
+    def _prune(self, current):
+        # Forget idle users whose bucket has refilled, so the maps don't grow forever
+        if len(self._buckets) < 1024:
+            return
+        now = time.monotonic()
+        waiting = {w[1] for w in self._waiting}
+        for user in list(self._buckets):
+            if user != current and user not in waiting and self._buckets[user].wait_time(now, self.burst) == 0:
+                del self._buckets[user]
+                self._last_tags.pop(user, None)
+
+    def stats(self):
+        with self._cond:
+            return {"active": self.active, "waiting": len(self._waiting), "maxConcurrency": self.max_concurrency}
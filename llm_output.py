@@ -0,0 +1,219 @@
+import re
+import ast
+import json
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+JSON_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+def _hex4(digits):
+    # The value of exactly four hex digits, else None (int() would also take signs,
+    # spaces and underscores)
+    return int(digits, 16) if len(digits) == 4 and set(digits) <= HEX_DIGITS else None
+
+
+class StreamedStringField:
+    # Pulls one string value (e.g. "modified_text") out of a JSON object that arrives
+    # in arbitrary pieces, decoding escapes as it goes, so the text can be shown
+    # before the object is complete. feed() returns the newly decoded characters.
+
+    def __init__(self, field):
+        self._key_re = re.compile(r'"' + re.escape(field) + r'"\s*:\s*"')
+        self._buffer = ""
+        self._pos = None
+        self.value = ""
+        self.done = False
+
+    def feed(self, chunk):
+        if self.done:
+            return ""
+        self._buffer += chunk
+        if self._pos is None:
+            match = self._key_re.search(self._buffer)
+            if match is None:
+                return ""
+            self._pos = match.end()
+        out = []
+        buffer, pos = self._buffer, self._pos
+        while pos < len(buffer):
+            char = buffer[pos]
+            if char == '"':
+                self.done = True
+                pos += 1
+                break
+            if char != '\\':
+                # Copy the whole run up to the next quote or escape in one step
+                end = pos + 1
+                while end < len(buffer) and buffer[end] not in '"\\':
+                    end += 1
+                out.append(buffer[pos:end])
+                pos = end
+                continue
+            if pos + 1 >= len(buffer):
+                break
+            escape = buffer[pos + 1]
+            if escape != 'u':
+                out.append(JSON_ESCAPES.get(escape, escape))
+                pos += 2
+                continue
+            decoded, length = self._unicode_escape(buffer, pos)
+            if decoded is None:
+                break
+            out.append(decoded)
+            pos += length
+        # Keep only the undecoded tail
+        self._buffer, self._pos = buffer[pos:], 0
+        text = "".join(out)
+        self.value += text
+        return text
+
+    @staticmethod
+    def _unicode_escape(buffer, pos):
+        # \uXXXX, or a \uD8XX\uDCXX surrogate pair; (None, 0) until enough has arrived.
+        # A malformed escape (e.g. \uZZZZ) is kept as literal text.
+        if pos + 6 > len(buffer):
+            return None, 0
+        code = _hex4(buffer[pos + 2:pos + 6])
+        if code is None:
+            return buffer[pos:pos + 2], 2
+        if 0xD800 <= code < 0xDC00:
+            if pos + 12 > len(buffer):
+                return None, 0
+            if buffer[pos + 6:pos + 8] == '\\u':
+                low = _hex4(buffer[pos + 8:pos + 12])
+                if low is not None and 0xDC00 <= low < 0xE000:
+                    return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)), 12
+        return chr(code), 6
+
+
+FENCE_RE = re.compile(r'```(?:json|JSON)?\s*(.*?)(?:```|$)', re.S)
+TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+KEYWORDS_RE = re.compile(r'["\']keywords["\']\s*:\s*\[([^\]]*)')
+# modified_text's value taken greedily up to the quote that closes it, for replies
+# with unescaped quotes inside the text
+GREEDY_VALUE_RE = re.compile(r'"modified_text"\s*:\s*"(.*)"\s*(?:,\s*"keywords"|}\s*$)', re.S)
+UNESCAPED_QUOTE_RE = re.compile(r'(?<!\\)"')
+QUOTED_RE = re.compile(r'"((?:[^"\\]|\\.)*)"|\'((?:[^\'\\]|\\.)*)\'')
+
+# How replies were read: "json" parsed as-is; "fenced", "repaired" and "partial" were
+# salvaged; "failed" (including replies with no JSON at all, such as a refusal) kept
+# the original
+parse_outcomes = Counter()
+_outcomes_lock = threading.Lock()
+
+
+def _close_truncated(text):
+    # Appends whatever closes an object cut off mid-string or mid-array
+    stack = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]' and stack:
+            stack.pop()
+    tail = ('\\' if escaped else '') + ('"' if in_string else '')
+    return TRAILING_COMMA_RE.sub(r'\1', (text + tail).rstrip().rstrip(',') + "".join(reversed(stack)))
+
+
+def _loads(candidate):
+    # json first (strict=False lets raw newlines and tabs through inside strings),
+    # then Python literal syntax for single-quoted keys and values
+    for attempt in (candidate, TRAILING_COMMA_RE.sub(r'\1', candidate)):
+        try:
+            value = json.loads(attempt, strict=False)
+        except ValueError:
+            try:
+                value = ast.literal_eval(attempt)
+            except (ValueError, SyntaxError, MemoryError, RecursionError):
+                continue
+        if isinstance(value, dict):
+            return value
+    return None
+
+
+def _keywords(value):
+    if isinstance(value, list):
+        return [str(k).strip() for k in value if str(k).strip()]
+    if isinstance(value, str):
+        return [k.strip() for k in value.split(",") if k.strip()]
+    return []
+
+
+def _record(outcome):
+    with _outcomes_lock:
+        parse_outcomes[outcome] += 1
+        total = sum(parse_outcomes.values())
+        salvaged = total - parse_outcomes["json"] - parse_outcomes["failed"]
+        failed = parse_outcomes["failed"]
+    if outcome != "json":
+        logger.warning("LLM reply parsed as %s (%d/%d salvaged, %d/%d failed so far)",
+                       outcome, salvaged, total, failed, total)
+
+
+def extract_rewrite(raw_text, record=True):
+    # Reads {"modified_text", "keywords"} from a model reply, tolerating code fences,
+    # prose around the object, raw control characters, single quotes, trailing commas
+    # and truncation. Returns (modified_text or None, keywords, outcome); None when
+    # the reply has no recoverable object. record=False leaves parse_outcomes alone.
+    raw_text = (raw_text or "").strip()
+    parsed = _loads(raw_text)
+    outcome = "json"
+    if parsed is None:
+        fenced = FENCE_RE.search(raw_text)
+        body = fenced.group(1).strip() if fenced else raw_text
+        start = body.find('{')
+        end = body.rfind('}')
+        if start != -1:
+            outcome = "fenced" if fenced else "repaired"
+            parsed = _loads(body[start:end + 1]) if end > start else None
+            if parsed is None:
+                outcome = "repaired"
+                parsed = _loads(_close_truncated(body[start:]))
+    if parsed is not None and isinstance(parsed.get("modified_text"), str):
+        if record:
+            _record(outcome)
+        return parsed["modified_text"].strip() or None, _keywords(parsed.get("keywords")), outcome
+    keywords = []
+    match = KEYWORDS_RE.search(raw_text)
+    if match:
+        keywords = [a or b for a, b in QUOTED_RE.findall(match.group(1))]
+    greedy = GREEDY_VALUE_RE.search(raw_text)
+    if greedy:
+        try:
+            value = json.loads('"' + UNESCAPED_QUOTE_RE.sub(r'\\"', greedy.group(1)) + '"', strict=False)
+        except ValueError:
+            value = ""
+        if value.strip():
+            if record:
+                _record("repaired")
+            return value.strip(), keywords, "repaired"
+    # Last resort: pull the fields out of whatever arrived. Prose with no
+    # modified_text at all (a refusal, an explanation) fails rather than
+    # replacing the user's text.
+    field = StreamedStringField("modified_text")
+    field.feed(raw_text)
+    if not field.value.strip():
+        single = re.search(r"'modified_text'\s*:\s*'((?:[^'\\]|\\.)*)", raw_text)
+        field.value = single.group(1) if single else ""
+    if field.value.strip():
+        if record:
+            _record("partial")
+        return field.value.strip(), keywords, "partial"
+    if record:
+        _record("failed")
+    return None, keywords, "failed"
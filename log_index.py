@@ -0,0 +1,216 @@
+import io
+import os
+import csv
+import json
+import threading
+from file_lock import locked, append_bytes
+
+
+def scan_records(f, start):
+    # Yields (offset, length) of each complete CSV record from byte `start`. A newline
+    # ends a record when the quotes seen so far in it are balanced (escaped quotes are
+    # doubled, so they never change the parity). A trailing partial record is not yielded.
+    f.seek(start)
+    offset = start
+    length = 0
+    quotes = 0
+    for line in f:
+        length += len(line)
+        quotes += line.count(b'"')
+        if quotes % 2 == 0 and line.endswith(b'\n'):
+            yield offset, length
+            offset += length
+            length = quotes = 0
+
+
+def _as_written(value):
+    # The text a value is stored as: lone surrogates become "?", as in _format_row
+    return str(value).encode('utf-8', errors='replace').decode('utf-8')
+
+
+class LogIndex:
+    # Sidecar index for an append-only CSV log: one line per data row with its byte
+    # offset, length and (user_email, project_name), so a project's rows can be read
+    # with seeks instead of parsing the whole log. The CSV is the source of truth:
+    # rows written after the index's last entry are indexed on the next access, an
+    # unterminated last row is left out until the next append settles it (a partial
+    # row left by a crash mid-append is cut off then), and the index is rebuilt from
+    # the log when the two disagree: the log is shorter than the index says, or a
+    # looked-up row isn't the group's. Appends and catch-ups hold the log's file
+    # lock, so several processes can share the log and its index.
+
+    def __init__(self, csv_path, headers):
+        self.csv_path = csv_path
+        self.index_path = csv_path + ".idx"
+        self.headers = headers
+        self._groups = {}
+        self._index_pos = 0
+        self._covered = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(user_email, project_name):
+        return (user_email or "").lower(), project_name or ""
+
+    def _format_row(self, row):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(row)
+        return _as_written(buffer.getvalue()).encode('utf-8')
+
+    def _reset(self):
+        self._groups = {}
+        self._index_pos = 0
+        self._covered = 0
+
+    def _read_index(self):
+        # Picks up entries appended since the last read; a torn last line is dropped
+        if not os.path.exists(self.index_path):
+            if self._index_pos:
+                self._reset()
+            return
+        with open(self.index_path, 'rb') as f:
+            size = f.seek(0, 2)
+            if size < self._index_pos:
+                self._reset()
+            f.seek(self._index_pos)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            with open(self.index_path, 'r+b') as f:
+                f.truncate(self._index_pos + end)
+        for line in data[:end].splitlines():
+            try:
+                offset, length, key = line.split(b'\t', 2)
+                offset, length = int(offset), int(length)
+                user, project = json.loads(key)
+            except ValueError:
+                continue
+            self._groups.setdefault((user, project), []).append((offset, length))
+            self._covered = max(self._covered, offset + length)
+        self._index_pos += end
+
+    def _catch_up(self, repair=False):
+        # Brings the index level with the log; returns the end of its last complete
+        # record. Reads never modify the log: an unterminated tail is just left out.
+        # repair=True (appends only, under the exclusive lock) settles the tail first.
+        self._read_index()
+        if not os.path.exists(self.csv_path):
+            if self._covered:
+                self.rebuild()
+            return 0
+        with open(self.csv_path, 'r+b' if repair else 'rb') as f:
+            size = f.seek(0, 2)
+            if size < self._covered:
+                # The log shrank or was replaced: the index no longer describes it
+                f.close()
+                self.rebuild()
+                return self._covered
+            if size == self._covered:
+                return size
+            entries = []
+            end = self._covered
+            for offset, length in scan_records(f, self._covered):
+                if offset > 0:
+                    entries.append((offset, length, self._read_row(f, offset, length)))
+                end = offset + length
+            if end < size and repair:
+                entry = self._repair_tail(f, end, size)
+                if entry is not None:
+                    if entry[0] > 0:
+                        entries.append(entry)
+                    end = entry[0] + entry[1]
+        self._append_entries(entries)
+        self._covered = max(self._covered, end)
+        return end
+
+    @staticmethod
+    def _read_row(f, offset, length):
+        f.seek(offset)
+        return next(csv.reader(io.StringIO(f.read(length).decode('utf-8', errors='replace'))), [])
+
+    def _repair_tail(self, f, start, size):
+        # An unterminated tail that is a whole record (e.g. a hand-edited or
+        # spreadsheet-saved log with no final newline) gets its line ending; anything
+        # else is a row cut short by a crash mid-append, which was never acknowledged
+        # and is cut off. Returns the tail's (offset, length, row) if it was kept.
+        f.seek(start)
+        tail = f.read(size - start)
+        rows = None
+        if tail.count(b'"') % 2 == 0:
+            try:
+                rows = list(csv.reader(io.StringIO(tail.decode('utf-8'))))
+            except (UnicodeDecodeError, csv.Error):
+                rows = None
+        if rows and len(rows) == 1 and len(rows[0]) == len(self.headers):
+            f.seek(size)
+            f.write(b"\r\n")
+            return start, size - start + 2, rows[0]
+        f.truncate(start)
+        return None
+
+    def _append_entries(self, entries):
+        if not entries:
+            return
+        lines = []
+        for offset, length, row in entries:
+            key = self._key(row[2] if len(row) > 2 else "", row[1] if len(row) > 1 else "")
+            lines.append(f"{offset}\t{length}\t{json.dumps(list(key))}\n")
+        with open(self.index_path, 'ab') as f:
+            f.write("".join(lines).encode('utf-8'))
+        self._read_index()
+
+    def rebuild(self):
+        # Re-derives the whole index from the log
+        tmp_path = self.index_path + ".tmp"
+        entries = []
+        if os.path.exists(self.csv_path):
+            with open(self.csv_path, 'rb') as f:
+                for offset, length in scan_records(f, 0):
+                    if offset == 0:
+                        continue
+                    row = self._read_row(f, offset, length)
+                    key = self._key(row[2] if len(row) > 2 else "", row[1] if len(row) > 1 else "")
+                    entries.append(f"{offset}\t{length}\t{json.dumps(list(key))}\n")
+        with open(tmp_path, 'wb') as f:
+            f.write("".join(entries).encode('utf-8'))
+        os.replace(tmp_path, self.index_path)
+        self._reset()
+        self._read_index()
+
+    def append(self, row):
+        self.append_many([row])
+
+    def append_many(self, rows, fsync=False):
+        # Appends the rows with a single write (adding the header to a new log),
+        # optionally fsyncs, then indexes them
+        with self._lock, locked(self.csv_path):
+            self._catch_up(repair=True)
+            encoded = [self._format_row(row) for row in rows]
+            offset = append_bytes(self.csv_path, b"".join(encoded), self._format_row(self.headers), fsync)
+            entries = []
+            for row, data in zip(rows, encoded):
+                entries.append((offset, len(data), [_as_written(v) for v in row[:3]]))
+                offset += len(data)
+            self._covered = offset
+            self._append_entries(entries)
+
+    def lookup(self, user_email, project_name):
+        # The group's rows, in log order, as {header: value} dicts. Each row read is
+        # checked against the key: a row that isn't the group's means the log was
+        # rewritten in place (same size, rows moved), so the index is rebuilt.
+        key = self._key(user_email, project_name)
+        for attempt in range(2):
+            with self._lock, locked(self.csv_path):
+                if attempt:
+                    self.rebuild()
+                self._catch_up()
+                positions = list(self._groups.get(key, ()))
+            if not positions:
+                return []
+            with open(self.csv_path, 'rb') as f:
+                headers = next(csv.reader(io.StringIO(f.readline().decode('utf-8'))), self.headers)
+                rows = [self._read_row(f, offset, length) for offset, length in positions]
+            matching = [row for row in rows if len(row) > 2 and self._key(row[2], row[1]) == key]
+            if len(matching) == len(rows):
+                break
+        return [dict(zip(headers, row)) for row in matching]
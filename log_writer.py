@@ -0,0 +1,189 @@
+import os
+import time
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Rows waiting to be written; submit() blocks (and counts it) when the queue is full
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "1000"))
+# Most rows written per batch, and how long the writer lingers to fill a batch
+LOG_BATCH_SIZE = int(os.environ.get("LOG_BATCH_SIZE", "100"))
+LOG_BATCH_LINGER = float(os.environ.get("LOG_BATCH_LINGER", "0.05"))
+# Attempts per batch before its rows are retried one by one (and failures dropped)
+LOG_WRITE_ATTEMPTS = 3
+# Seconds between stats() log lines while rows are being written (0 turns them off);
+# they're warnings when submits had to wait for room since the last one
+LOG_STATS_INTERVAL = float(os.environ.get("LOG_STATS_INTERVAL", "60"))
+
+_STOP = object()
+
+
+class BatchedLogWriter:
+    # Moves log writes off the request path: rows go into a bounded queue and one
+    # background thread writes whatever has accumulated as a single batch (group
+    # commit) via write_batch(rows). close() drains the queue; wait_idle() lets a
+    # reader see the rows submitted before it.
+
+    def __init__(self, write_batch, max_queue=LOG_QUEUE_SIZE, max_batch=LOG_BATCH_SIZE, linger=LOG_BATCH_LINGER,
+                 stats_interval=LOG_STATS_INTERVAL):
+        self.write_batch = write_batch
+        self.max_batch = max_batch
+        self.linger = linger
+        self.stats_interval = stats_interval
+        self._stats_logged_at = time.monotonic()
+        self._stats_logged = (0, 0)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._pid = None
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._start_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.blocked = 0
+        self.blocked_seconds = 0.0
+
+    def _ensure_thread(self):
+        # Started on first use, and again in a forked worker, which doesn't inherit threads
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, row):
+        self._ensure_thread()
+        with self._idle:
+            self._pending += 1
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            # Backpressure: the writer is behind, so this request waits for room
+            start = time.monotonic()
+            self._queue.put(row)
+            with self.stats_lock:
+                self.blocked += 1
+                self.blocked_seconds += time.monotonic() - start
+                blocked = self.blocked
+            if blocked % 100 == 1:
+                logger.warning("Log writer queue full; %d submits have waited for room (%s)", blocked, self.stats())
+        with self.stats_lock:
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def _next_batch(self):
+        # Empty when nothing arrived within the stats interval
+        try:
+            batch = [self._queue.get(timeout=self.stats_interval or None)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.max_batch and batch[-1] is not _STOP:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            self._log_stats()
+            if not batch:
+                continue
+            stop = batch[-1] is _STOP
+            rows = batch[:-1] if stop else batch
+            if rows:
+                self._write(rows)
+            if stop:
+                return
+
+    def _write(self, rows):
+        failed = rows
+        if self._write_batch(rows, LOG_WRITE_ATTEMPTS):
+            failed = []
+        elif len(rows) > 1:
+            # One bad row (e.g. a value the backend can't store) mustn't take the rest
+            # of the batch with it: write them one at a time and drop only the failures
+            failed = [row for row in rows if not self._write_batch([row], 1)]
+        if failed:
+            logger.error("Dropping %d of %d log rows after failed writes", len(failed), len(rows))
+            with self.stats_lock:
+                self.failed += len(failed)
+        with self._idle:
+            self._pending -= len(rows)
+            self._idle.notify_all()
+
+    def _write_batch(self, rows, attempts):
+        # True once write_batch(rows) succeeds, False after `attempts` failures
+        for attempt in range(attempts):
+            try:
+                self.write_batch(rows)
+            except Exception:
+                if attempt == attempts - 1:
+                    logger.exception("Writing %d log rows failed %d times", len(rows), attempts)
+                    return False
+                time.sleep(0.1 * 2 ** attempt)
+            else:
+                with self.stats_lock:
+                    self.written += len(rows)
+                    self.batches += 1
+                return True
+
+    def _log_stats(self):
+        # Periodic stats() line, only when rows were submitted since the last one
+        if not self.stats_interval or time.monotonic() - self._stats_logged_at < self.stats_interval:
+            return
+        stats = self.stats()
+        submitted, blocked = stats["submitted"], stats["blocked"]
+        if submitted != self._stats_logged[0]:
+            level = logging.WARNING if blocked != self._stats_logged[1] else logging.INFO
+            logger.log(level, "Log writer stats: %s", stats)
+        self._stats_logged_at = time.monotonic()
+        self._stats_logged = (submitted, blocked)
+
+    def wait_idle(self, timeout=None):
+        # True once every row submitted so far has been written (or given up on)
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout=None):
+        # Writes everything still queued, then stops the thread. Gives up after
+        # `timeout` seconds (e.g. the disk or database is stalled) and logs what's left.
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+            self._thread.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+        except queue.Full:
+            pass
+        if self._thread.is_alive():
+            with self._idle:
+                pending = self._pending
+            logger.error("Log writer didn't drain within %ss; %d rows not written (%s)",
+                         timeout, pending, self.stats())
+            return False
+        return True
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                "queueDepth": self._queue.qsize(),
+                "maxQueueDepth": self.max_depth,
+                "submitted": self.submitted,
+                "written": self.written,
+                "batches": self.batches,
+                "failed": self.failed,
+                "blocked": self.blocked,
+                "blockedSeconds": round(self.blocked_seconds, 3),
+            }
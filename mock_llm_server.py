@@ -0,0 +1,191 @@
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import hashlib
+from collections import Counter
+from flask import Flask, Response, request, jsonify
+
+# Stand-in for the chat-completions API, for load tests and offline runs. Start it
+# and point the app at it with LLM_API_BASE=http://127.0.0.1:8001/v1:
+#
+#   python mock_llm_server.py --latency-ms 800 --latency-dist lognormal --error-rate 0.02
+#
+# Rewrites are deterministic (the same prompt and choice index always give the same
+# text); latency and injected errors are random, repeatable with --seed.
+
+app = Flask(__name__)
+settings = argparse.Namespace(
+    latency_ms=500.0, latency_dist="fixed", latency_spread=0.5, error_rate=0.0,
+    rate_limit_rate=0.0, stream_chunk_chars=12, seed=None,
+)
+rng = random.Random()
+
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+WORD_RE = re.compile(r"[A-Za-z']+")
+SIMPLER_WORDS = {
+    "approximately": "about", "utilize": "use", "utilizes": "uses", "utilization": "use",
+    "demonstrate": "show", "demonstrates": "shows", "additional": "more", "assistance": "help",
+    "commence": "start", "consequently": "so", "facilitate": "help",
+    "individuals": "people", "methodology": "method", "numerous": "many", "objective": "goal",
+    "obtain": "get", "purchase": "buy", "regarding": "about", "subsequently": "later",
+    "sufficient": "enough", "therefore": "so", "nevertheless": "still", "comprehensive": "full",
+}
+STOP_WORDS = {"the", "and", "that", "with", "this", "from", "have", "for", "are", "was", "you", "your"}
+
+
+def latency_seconds():
+    median = settings.latency_ms / 1000
+    if settings.latency_dist == "uniform":
+        return rng.uniform(median * (1 - settings.latency_spread), median * (1 + settings.latency_spread))
+    if settings.latency_dist == "lognormal":
+        # median stays at latency_ms; spread is sigma, so the tail grows with it
+        return median * rng.lognormvariate(0, settings.latency_spread)
+    return median
+
+
+def prompt_text(messages):
+    # The text to rewrite is the "Input:" block of the first user message; solver
+    # follow-ups re-send the previous reply as the assistant turn
+    for message in reversed(messages):
+        if message.get("role") == "assistant":
+            try:
+                return json.loads(message["content"])["modified_text"]
+            except (ValueError, KeyError, TypeError):
+                break
+    for message in messages:
+        if message.get("role") == "user":
+            return message.get("content", "").split("Input:\n", 1)[-1]
+    return ""
+
+
+def rewrite(text, variant):
+    # Swaps long words for common ones and, for higher variants, splits long sentences
+    # at commas, which moves the readability scores in a predictable direction
+    max_words = max(8, 24 - 6 * variant)
+    sentences = []
+    for sentence in SENTENCE_RE.split(text.strip()):
+        words = sentence.split()
+        if len(words) > max_words and ", " in sentence:
+            parts = [part.strip() for part in sentence.split(", ") if part.strip()]
+            sentence = ". ".join(part[0].upper() + part[1:] for part in parts)
+            if sentence[-1] not in ".!?":
+                sentence += "."
+        sentences.append(sentence)
+    rewritten = " ".join(sentences)
+
+    def simplify(match):
+        word = match.group(0)
+        simple = SIMPLER_WORDS.get(word.lower())
+        if simple is None:
+            return word
+        return simple.capitalize() if word[0].isupper() else simple
+
+    return WORD_RE.sub(simplify, rewritten)
+
+
+def keywords(text):
+    counts = Counter(w.lower() for w in WORD_RE.findall(text) if len(w) > 3 and w.lower() not in STOP_WORDS)
+    return [word for word, _ in counts.most_common(3)] or ["content"]
+
+
+def reply_content(messages, variant):
+    text = prompt_text(messages)
+    modified = rewrite(text, variant) or text
+    return json.dumps({"modified_text": modified, "keywords": keywords(text)})
+
+
+def error_response(status, message, error_type):
+    response = jsonify({"error": {"message": message, "type": error_type, "param": None, "code": None}})
+    response.status_code = status
+    if status == 429:
+        response.headers["Retry-After"] = "1"
+    return response
+
+
+def injected_error():
+    roll = rng.random()
+    if roll < settings.rate_limit_rate:
+        return error_response(429, "Rate limit reached (mock).", "requests")
+    if roll < settings.rate_limit_rate + settings.error_rate:
+        return error_response(503, "The server is overloaded (mock).", "server_error")
+    return None
+
+
+@app.route("/v1/chat/completions", methods=["POST"])
+def chat_completions():
+    body = request.get_json(silent=True) or {}
+    messages = body.get("messages") or []
+    model = body.get("model", "mock")
+    n = int(body.get("n", 1))
+    error = injected_error()
+    if error is not None:
+        time.sleep(latency_seconds() / 10)
+        return error
+    completion_id = "chatcmpl-mock-" + hashlib.sha1(json.dumps(messages).encode()).hexdigest()[:16]
+    created = int(time.time())
+    delay = latency_seconds()
+    if not body.get("stream"):
+        time.sleep(delay)
+        choices = [
+            {"index": i, "message": {"role": "assistant", "content": reply_content(messages, i)},
+             "finish_reason": "stop"}
+            for i in range(n)
+        ]
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        completion_tokens = sum(len(c["message"]["content"]) for c in choices) // 4
+        return jsonify({
+            "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+            "choices": choices,
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+    content = reply_content(messages, 0)
+    pieces = [content[i:i + settings.stream_chunk_chars]
+              for i in range(0, len(content), settings.stream_chunk_chars)]
+
+    def events():
+        # About a fifth of the latency goes to the first token, the rest is spread over the stream
+        time.sleep(delay * 0.2)
+        step = delay * 0.8 / max(len(pieces), 1)
+        deltas = [{"role": "assistant"}] + [{"content": piece} for piece in pieces]
+        for index, delta in enumerate(deltas):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            if index:
+                time.sleep(step)
+        final = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        yield f"data: {json.dumps(final)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return Response(events(), mimetype="text/event-stream", headers={"X-Request-Id": uuid.uuid4().hex})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock chat-completions server for load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=settings.latency_ms,
+                        help="Median response time in milliseconds")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default=settings.latency_dist)
+    parser.add_argument("--latency-spread", type=float, default=settings.latency_spread,
+                        help="uniform: +/- fraction of the median; lognormal: sigma")
+    parser.add_argument("--error-rate", type=float, default=settings.error_rate,
+                        help="Fraction of requests answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=settings.rate_limit_rate,
+                        help="Fraction of requests answered with 429")
+    parser.add_argument("--stream-chunk-chars", type=int, default=settings.stream_chunk_chars)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    vars(settings).update({k: v for k, v in vars(args).items() if k not in ("host", "port")})
+    rng.seed(args.seed)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
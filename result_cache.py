@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def content_key(*parts):
+    # Content address for a cached result: SHA-256 over the parts that determine it
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResultCache:
+    # Bounded in-memory LRU of JSON-serializable results. With a db_path, entries are
+    # also written to a SQLite table (WAL mode) so every worker process shares hits.
+    # A ttl (seconds) expires entries in both tiers; 0 keeps them until evicted.
+
+    def __init__(self, name, maxsize, db_path="", max_rows=100000, ttl=0):
+        self.name = name
+        self.maxsize = maxsize
+        self.db_path = db_path
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        if db_path:
+            with self._connect() as conn:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name} "
+                    "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+                )
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_created ON {name} (created)")
+
+    def _connect(self):
+        # sqlite3 connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _expired(self, created, now):
+        return self.ttl > 0 and now - created > self.ttl
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created, now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+        if self.db_path:
+            try:
+                row = self._connect().execute(
+                    f"SELECT value, created FROM {self.name} WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row is not None and not self._expired(row[1], now):
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                with self._lock:
+                    self.hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        now = time.time()
+        self._remember(key, value, now)
+        if self.db_path:
+            try:
+                with self._connect() as conn:
+                    conn.execute(
+                        f"INSERT OR REPLACE INTO {self.name} (key, value, created) VALUES (?, ?, ?)",
+                        (key, json.dumps(value), now),
+                    )
+                    self._writes += 1
+                    if self._writes % 256 == 0:
+                        if self.ttl > 0:
+                            conn.execute(f"DELETE FROM {self.name} WHERE created < ?", (now - self.ttl,))
+                        conn.execute(
+                            f"DELETE FROM {self.name} WHERE key IN (SELECT key FROM {self.name} "
+                            "ORDER BY created DESC LIMIT -1 OFFSET ?)", (self.max_rows,))
+            except sqlite3.Error:
+                # The shared tier is an optimization; a locked or broken db must not fail the request
+                pass
+
+    def _remember(self, key, value, created):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, created)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
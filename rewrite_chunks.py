@@ -0,0 +1,86 @@
+import os
+import re
+
+# Input tokens per rewrite request. The reply has to fit in max_tokens (1500) as JSON,
+# and rewrites can run longer than their input, so this leaves headroom.
+REWRITE_CHUNK_TOKENS = int(os.environ.get("REWRITE_CHUNK_TOKENS", "800"))
+# Chunks of one document rewritten at the same time
+REWRITE_CHUNK_WORKERS = int(os.environ.get("REWRITE_CHUNK_WORKERS", "4"))
+
+# Capturing, so the whitespace between paragraphs and sentences can be put back as it was
+BLANK_LINE_RE = re.compile(r'(\n\s*\n)')
+SENTENCE_END_RE = re.compile(r'(?<=[.!?])(\s+)')
+
+
+def estimate_tokens(text):
+    # No tokenizer is installed; ~4 characters per token is close for English prose
+    return (len(text) + 3) // 4
+
+
+def _with_separators(parts):
+    # re.split with a capturing group alternates text and separator; pairs each
+    # text with the separator before it ("" for the first)
+    return zip(parts[0::2], [""] + parts[1::2])
+
+
+def _split_long_paragraph(paragraph, max_tokens):
+    # A paragraph over budget (without surrounding whitespace) is cut between
+    # sentences into (piece, separator) pairs; a single over-long sentence is sent as
+    # it is rather than cut mid-word
+    pieces = []
+    current = ""
+    current_separator = ""
+    for sentence, separator in _with_separators(SENTENCE_END_RE.split(paragraph)):
+        if current and estimate_tokens(current + separator + sentence) > max_tokens:
+            pieces.append((current, current_separator))
+            current, current_separator = sentence, separator
+        else:
+            current = current + separator + sentence if current else sentence
+    if current:
+        pieces.append((current, current_separator))
+    return pieces
+
+
+def split_rewrite_chunks(text, max_tokens=REWRITE_CHUNK_TOKENS):
+    # Groups consecutive paragraphs into chunks of at most max_tokens (estimated) and
+    # returns (chunk, separator) pairs: the whitespace that stood before each chunk
+    # in the text, so joining separator + chunk gives back the text exactly. Chunks
+    # start and end on non-space characters, except that the first separator holds
+    # any leading whitespace and the last chunk keeps any trailing whitespace. Text
+    # under the budget comes back unchanged as one chunk.
+    if estimate_tokens(text) <= max_tokens:
+        return [(text, "")]
+    body = text.strip()
+    if not body:
+        return [(text, "")]
+    units = []
+    # Whitespace seen since the last unit: blank lines, and spaces around paragraphs
+    pending = text[:len(text) - len(text.lstrip())]
+    for paragraph, separator in _with_separators(BLANK_LINE_RE.split(body)):
+        stripped = paragraph.strip()
+        if not stripped:
+            pending += separator + paragraph
+            continue
+        pending += separator + paragraph[:len(paragraph) - len(paragraph.lstrip())]
+        if estimate_tokens(stripped) > max_tokens:
+            pieces = _split_long_paragraph(stripped, max_tokens)
+        else:
+            pieces = [(stripped, "")]
+        units.append((pieces[0][0], pending))
+        units.extend(pieces[1:])
+        pending = paragraph[len(paragraph.rstrip()):]
+    chunks = []
+    current = None
+    current_tokens = 0
+    for unit, separator in units:
+        tokens = estimate_tokens(unit)
+        if current is not None and current_tokens + tokens > max_tokens:
+            chunks.append(current)
+            current, current_tokens = None, 0
+        current = (unit, separator) if current is None else (current[0] + separator + unit, current[1])
+        current_tokens += tokens
+    if current is not None:
+        chunks.append(current)
+    trailing = text[len(text.rstrip()):]
+    chunks[-1] = (chunks[-1][0] + pending + trailing, chunks[-1][1])
+    return chunks
@@ -0,0 +1,59 @@
+import threading
+from concurrent.futures import Future
+
+
+class FlightAbandoned(Exception):
+    # The leader stopped without a result (e.g. its streaming client went away);
+    # callers waiting on it start a flight of their own
+    pass
+
+
+class SingleFlight:
+    # Collapses concurrent calls that share a key: the first caller runs the function
+    # and everyone who arrives while it is in flight waits for the same result (or
+    # exception). Nothing is kept once the call finishes; caching is up to the caller.
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key):
+        # Returns (future, leader). The leader does the work and must finish() the key;
+        # the others wait on future.result(). For work that can't be one call to do(),
+        # such as a reply streamed to the leader's client as it arrives.
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        return future, leader
+
+    def finish(self, key, result=None, error=None):
+        with self._lock:
+            future = self._calls.pop(key)
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def do(self, key, fn):
+        # Returns (result, shared); shared is True for callers that joined a flight
+        while True:
+            future, leader = self.claim(key)
+            if leader:
+                break
+            try:
+                return future.result(), True
+            except FlightAbandoned:
+                continue
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, error=e)
+            raise
+        self.finish(key, result)
+        return result, False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,205 @@
+import os
+import re
+import csv
+import json
+import mmap
+import string
+import struct
+import threading
+from collections import OrderedDict
+from textstat import syllable_count
+
+SYLLABLE_CACHE_SIZE = int(os.environ.get("SYLLABLE_CACHE_SIZE", "50000"))
+# Optional JSON snapshot used to warm the cache at startup (and refreshed on exit);
+# it records the dictionary build it was taken with and is ignored under another one
+SYLLABLE_CACHE_SNAPSHOT = os.environ.get("SYLLABLE_CACHE_SNAPSHOT", "")
+# Compiled dictionary built by build_syllable_dict.py; textstat is used when it's missing
+SYLLABLE_DICT_PATH = os.environ.get("SYLLABLE_DICT_PATH", "syllables.bin")
+
+# textstat strips ASCII punctuation before counting words and syllables
+PUNCTUATION_RE = re.compile(f'[{re.escape(string.punctuation)}]')
+
+# File layout: magic, entry count, (count + 1) uint32 key offsets, count uint8
+# syllable values, then the UTF-8 keys concatenated in sorted byte order.
+DICT_MAGIC = b"SYL1"
+DICT_HEADER = struct.Struct("<4sI")
+DICT_OFFSET = struct.Struct("<II")
+
+
+def normalize_word(word):
+    return PUNCTUATION_RE.sub('', word.lower())
+
+
+class SyllableDictionary:
+    # Read-only, memory-mapped view of a compiled syllable dictionary. Opening it
+    # only reads the header and the pages are shared between worker processes.
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(f.fileno())
+        # Identifies this build of the dictionary, e.g. for keying cached results
+        self.fingerprint = f"{stat.st_size}:{stat.st_mtime_ns}"
+        magic, self.count = DICT_HEADER.unpack_from(self._map, 0)
+        if magic != DICT_MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a compiled syllable dictionary")
+        self._offsets_base = DICT_HEADER.size
+        self._values_base = self._offsets_base + 4 * (self.count + 1)
+        self._keys_base = self._values_base + self.count
+
+    def get(self, word):
+        key = word.encode('utf-8')
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start, end = DICT_OFFSET.unpack_from(self._map, self._offsets_base + 4 * mid)
+            probe = self._map[self._keys_base + start:self._keys_base + end]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return self._map[self._values_base + mid]
+        return None
+
+    def __len__(self):
+        return self.count
+
+
+def open_syllable_dictionary(path=SYLLABLE_DICT_PATH):
+    if path and os.path.exists(path):
+        return SyllableDictionary(path)
+    return None
+
+
+def write_syllable_dictionary(entries, path):
+    keys = sorted((word.encode('utf-8'), min(count, 255)) for word, count in entries.items())
+    offsets = [0]
+    for key, _ in keys:
+        offsets.append(offsets[-1] + len(key))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(DICT_HEADER.pack(DICT_MAGIC, len(keys)))
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(bytes(count for _, count in keys))
+        f.write(b"".join(key for key, _ in keys))
+    os.replace(tmp_path, path)
+    return len(keys)
+
+
+def read_pronunciations(path):
+    # CMUdict-style lines: "word  P R AH0 N ..."; a syllable is a phoneme carrying a
+    # stress digit. Alternate pronunciations ("word(2)") are skipped.
+    entries = {}
+    with open(path, encoding='latin-1') as f:
+        for line in f:
+            if not line.strip() or line.startswith(';;;'):
+                continue
+            word, _, phonemes = line.strip().partition(' ')
+            if word.endswith(')'):
+                continue
+            word = normalize_word(word)
+            if word and word not in entries:
+                entries[word] = sum(1 for p in phonemes.split() if p[-1].isdigit())
+    return entries
+
+
+def read_corpus_words(paths, columns=("Original Text", "Modified Text")):
+    csv.field_size_limit(2 ** 31 - 1)
+    words = set()
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, newline='', encoding='utf-8') as csvfile:
+            for row in csv.DictReader(csvfile):
+                for column in columns:
+                    for word in (row.get(column) or "").split():
+                        normalized = normalize_word(word)
+                        if normalized:
+                            words.add(normalized)
+    return words
+
+
+class SyllableCache:
+    # Process-wide LRU memo of syllable counts, keyed on the normalized word
+    # (lowercased, punctuation stripped) so every request shares the same entries.
+    # Misses go to the compiled dictionary first and to textstat for unknown words.
+
+    def __init__(self, maxsize=SYLLABLE_CACHE_SIZE, dictionary=None):
+        self.maxsize = maxsize
+        self.dictionary = dictionary
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, word):
+        with self._lock:
+            count = self._entries.get(word)
+            if count is not None:
+                self._entries.move_to_end(word)
+                self.hits += 1
+                return count
+            self.misses += 1
+        count = self.dictionary.get(word) if self.dictionary is not None else None
+        if count is None:
+            count = syllable_count(word)
+        self._put(word, count)
+        return count
+
+    def _put(self, word, count):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[word] = count
+            self._entries.move_to_end(word)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    @property
+    def fingerprint(self):
+        # Where counts come from: the dictionary build, or textstat alone
+        return self.dictionary.fingerprint if self.dictionary is not None else "textstat"
+
+    def load(self, path):
+        # An unreadable snapshot (missing, truncated, corrupt) just means a cold cache
+        try:
+            with open(path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            # Counts from another dictionary build (or an unversioned snapshot) would
+            # override the current dictionary, so they're dropped
+            if not isinstance(snapshot, dict) or snapshot.get("dictionary") != self.fingerprint:
+                return 0
+            entries = [(str(word), int(count)) for word, count in snapshot.get("entries", {}).items()]
+        except (OSError, ValueError, TypeError, AttributeError):
+            return 0
+        for word, count in entries:
+            self._put(word, count)
+        return len(entries)
+
+    def dump(self, path):
+        with self._lock:
+            entries = dict(self._entries)
+        # Per-process temp file: every worker dumps at shutdown, possibly at once
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"dictionary": self.fingerprint, "entries": entries}, f)
+        os.replace(tmp_path, path)
+
+
+syllable_cache = SyllableCache(dictionary=open_syllable_dictionary())
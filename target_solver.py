@@ -0,0 +1,78 @@
+import os
+import time
+
+from text_metrics import calculate_text_metrics
+
+# Candidates requested per model call (the API's n)
+SOLVER_CANDIDATES = int(os.environ.get("SOLVER_CANDIDATES", "3"))
+# Budget per solve: model round trips and wall-clock seconds
+SOLVER_MAX_CALLS = int(os.environ.get("SOLVER_MAX_CALLS", "3"))
+SOLVER_TIME_BUDGET = float(os.environ.get("SOLVER_TIME_BUDGET", "60"))
+# A candidate within both tolerances is accepted: reading ease points and grade levels
+SOLVER_SCORE_TOLERANCE = float(os.environ.get("SOLVER_SCORE_TOLERANCE", "5"))
+SOLVER_GRADE_TOLERANCE = float(os.environ.get("SOLVER_GRADE_TOLERANCE", "1"))
+
+# target_score is a Flesch reading ease, target_grade a Flesch-Kincaid grade
+SOLVER_FIELDS = ["fleschKincaid", "readingEase"]
+
+
+def target_distance(metrics, target_score, target_grade):
+    # Misses in units of their tolerance, so 1.0 on either axis is the acceptance edge
+    return max(
+        abs(metrics["readingEase"] - target_score) / SOLVER_SCORE_TOLERANCE,
+        abs(metrics["fleschKincaid"] - target_grade) / SOLVER_GRADE_TOLERANCE,
+    )
+
+
+def correction_prompt(metrics, target_score, target_grade):
+    ease, grade = metrics["readingEase"], metrics["fleschKincaid"]
+    if ease < target_score:
+        direction = "Make it easier to read: use shorter sentences and shorter, more common words."
+    else:
+        direction = "Make it slightly more sophisticated: use longer sentences and richer vocabulary."
+    return (
+        f"That version has a Flesch reading ease of {ease} and a grade level of {grade}. "
+        f"The targets are a reading ease of {target_score} (off by {round(target_score - ease, 1):+g}) "
+        f"and a grade level of {target_grade} (off by {round(target_grade - grade, 1):+g}). "
+        f"{direction} Keep the meaning. "
+        f"Respond ONLY in VALID JSON with exactly two keys: 'modified_text' and 'keywords'."
+    )
+
+
+def solve_targets(messages, complete, parse, fallback, target_score, target_grade):
+    # Closed loop around the model: ask for several candidates, score each locally and
+    # keep the closest; while it is outside tolerance and budget remains, re-prompt
+    # with the exact miss. complete(messages, n) returns n raw replies and
+    # parse(raw, fallback) returns (text, keywords). Returns (best, stats), where
+    # best is {"raw", "text", "keywords", "metrics", "distance"}.
+    start = time.monotonic()
+    best = None
+    calls = 0
+    candidates = 0
+    while calls < SOLVER_MAX_CALLS:
+        elapsed = time.monotonic() - start
+        # Don't start a round trip that the budget can't cover at the pace so far
+        if calls and elapsed + elapsed / calls > SOLVER_TIME_BUDGET:
+            break
+        replies = complete(messages, SOLVER_CANDIDATES)
+        calls += 1
+        for raw in replies:
+            text, keywords = parse(raw, fallback)
+            metrics = calculate_text_metrics(text, SOLVER_FIELDS)
+            distance = target_distance(metrics, target_score, target_grade)
+            candidates += 1
+            if best is None or distance < best["distance"]:
+                best = {"raw": raw, "text": text, "keywords": keywords, "metrics": metrics, "distance": distance}
+        if best is None or best["distance"] <= 1:
+            break
+        messages = messages + [
+            {"role": "assistant", "content": best["raw"]},
+            {"role": "user", "content": correction_prompt(best["metrics"], target_score, target_grade)},
+        ]
+    stats = {
+        "roundTrips": calls,
+        "candidates": candidates,
+        "withinTolerance": best is not None and best["distance"] <= 1,
+        "elapsed": round(time.monotonic() - start, 2),
+    }
+    return best, stats
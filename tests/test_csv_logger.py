@@ -0,0 +1,57 @@
+import csv
+import multiprocessing
+import sqlite3
+
+import csv_logger
+
+
+def write_csv(path, headers, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        writer.writerows(rows)
+
+
+def open_store(directory, barrier):
+    import os
+    os.chdir(directory)
+    barrier.wait()
+    csv_logger.SQLiteLogStore("metrics.db")
+
+
+def test_concurrent_first_start_imports_history_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    log_rows = [[f"2025-01-01 00:00:{i:02d}", "P", "a@b.c"] + [str(i)] * (len(csv_logger.HEADERS) - 3)
+                for i in range(50)]
+    write_csv(csv_logger.CSV_FILE, csv_logger.HEADERS, log_rows)
+    write_csv(csv_logger.PROJECTS_CSV, csv_logger.PROJECT_HEADERS, [["2025-01-01 00:00:00", "P", "a@b.c"]] * 3)
+
+    # Separate processes, as gunicorn workers would be, all opening a new database at once
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(6)
+    workers = [context.Process(target=open_store, args=(str(tmp_path), barrier)) for _ in range(6)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    assert [worker.exitcode for worker in workers] == [0] * 6
+
+    conn = sqlite3.connect("metrics.db")
+    assert conn.execute("SELECT COUNT(*) FROM metrics_log").fetchone()[0] == 50
+    assert conn.execute("SELECT COUNT(*) FROM projects").fetchone()[0] == 3
+    store = csv_logger.SQLiteLogStore("metrics.db")
+    assert [row["Chosen Age"] for row in store.read_project_logs("P", "A@B.C")] == [str(i) for i in range(50)]
+
+
+def test_lone_surrogates_are_logged_not_fatal(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv_logger, "LOG_ASYNC", False)
+    data = {"projectName": "P \ud83d", "userEmail": "a@b.c", "originalText": "half an emoji \ud83d"}
+    for backend in ["csv", "sqlite"]:
+        (tmp_path / backend).mkdir()
+        monkeypatch.chdir(tmp_path / backend)
+        monkeypatch.setattr(csv_logger, "LOG_BACKEND", backend)
+        monkeypatch.setattr(csv_logger, "_store", None)
+        monkeypatch.setattr(csv_logger, "log_index", csv_logger.LogIndex(csv_logger.CSV_FILE, csv_logger.HEADERS))
+        csv_logger.log_to_csv(data)
+        rows = csv_logger.read_project_logs("P ?", "a@b.c")
+        assert [row["Original Text"] for row in rows] == ["half an emoji ?"]
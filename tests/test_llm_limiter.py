@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+import llm_limiter
+from llm_limiter import FairLimiter, TokenBucket, parse_weights
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_token_bucket_refills_at_its_rate_up_to_the_burst():
+    bucket = TokenBucket(rate_per_second=2, burst=3)
+    now = bucket.updated
+    bucket.tokens = 0
+    assert bucket.wait_time(now) == 0.5
+    assert bucket.wait_time(now, tokens=2) == 1.0
+    assert bucket.wait_time(now + 0.5) == 0
+    assert bucket.wait_time(now + 60) == 0 and bucket.tokens == 3
+    assert TokenBucket(0, 1).wait_time(now, tokens=2) == float("inf")
+
+
+def test_parse_weights():
+    assert parse_weights(" Team@example.com=3, batch@example.com=0.5,,bad") == {
+        "team@example.com": 3.0, "batch@example.com": 0.5}
+
+
+def test_waiting_calls_are_admitted_in_fair_order():
+    # One slot, held while a heavy user queues three calls and then a light user one:
+    # the light user's call goes second, not behind the heavy user's backlog
+    limiter = FairLimiter(max_concurrency=1, rate_per_minute=6000, burst=100, weights={}, timeout=5)
+    order = []
+
+    def call(user):
+        with limiter.slot(user):
+            order.append(user)
+
+    threads = []
+    with limiter.slot("holder"):
+        for user in ["heavy", "heavy", "heavy", "light"]:
+            threads.append(threading.Thread(target=call, args=(user,)))
+            threads[-1].start()
+            wait_for(lambda: limiter.stats()["waiting"] == len(threads))
+    for thread in threads:
+        thread.join(5)
+    assert order == ["heavy", "light", "heavy", "heavy"]
+    assert limiter.stats() == {"active": 0, "waiting": 0, "maxConcurrency": 1}
+
+
+def test_weights_give_a_user_a_larger_share():
+    limiter = FairLimiter(max_concurrency=1, rate_per_minute=6000, burst=100, weights={"team": 4.0}, timeout=5)
+    order = []
+
+    def call(user):
+        with limiter.slot(user):
+            order.append(user)
+
+    threads = []
+    with limiter.slot("holder"):
+        for user in ["other", "other", "team", "team", "team"]:
+            threads.append(threading.Thread(target=call, args=(user,)))
+            threads[-1].start()
+            wait_for(lambda: limiter.stats()["waiting"] == len(threads))
+    for thread in threads:
+        thread.join(5)
+    assert order == ["team", "team", "team", "other", "other"]
+
+
+def test_a_user_without_tokens_waits_and_times_out(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_limiter.time, "monotonic", clock)
+    limiter = FairLimiter(max_concurrency=4, rate_per_minute=60, burst=1, weights={}, timeout=0)
+    with limiter.slot("user"):
+        pass
+    # The bucket is empty: the next call is a second away, and with no queue time left it fails
+    assert limiter.estimate("user") == (0, 1.0)
+    with pytest.raises(TimeoutError):
+        with limiter.slot("user"):
+            pass
+    # Other users have their own bucket
+    with limiter.slot("someone else"):
+        pass
+    clock.now += 1
+    with limiter.slot("user"):
+        pass
+    assert limiter.stats()["waiting"] == 0
+
+
+def test_a_full_limiter_times_out_queued_calls():
+    limiter = FairLimiter(max_concurrency=1, rate_per_minute=6000, burst=100, weights={}, timeout=0.05)
+    with limiter.slot("holder"):
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            with limiter.slot("user"):
+                pass
+        assert time.monotonic() - start < 2
+    assert limiter.stats() == {"active": 0, "waiting": 0, "maxConcurrency": 1}
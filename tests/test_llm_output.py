@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from llm_output import StreamedStringField, extract_rewrite
+
+
+def feed_in_pieces(raw, size):
+    field = StreamedStringField("modified_text")
+    deltas = [field.feed(raw[i:i + size]) for i in range(0, len(raw), size)]
+    assert "".join(deltas) == field.value
+    return field
+
+
+@pytest.mark.parametrize("size", [1, 3, 1000])
+def test_streamed_field_decodes_escapes_across_pieces(size):
+    value = 'Line one\nsaid "hi" \\ tab\t café 😀 end'
+    field = feed_in_pieces(json.dumps({"modified_text": value, "keywords": []}), size)
+    assert field.done and field.value == value
+
+
+@pytest.mark.parametrize("size", [1, 5, 1000])
+def test_streamed_field_keeps_malformed_unicode_escape_as_text(size):
+    field = feed_in_pieces('{"modified_text": "a\\uZZZZb \\u12 c \\ud83d\\uXYZW d"}', size)
+    assert field.done
+    assert field.value == "a\\uZZZZb \\u12 c \ud83d\\uXYZW d"
+
+
+def test_malformed_unicode_escape_is_salvaged():
+    text, keywords, outcome = extract_rewrite('{"modified_text": "bad \\uXYZW escape", "keywords": ["k"]}')
+    assert text == "bad \\uXYZW escape"
+    assert outcome in ("repaired", "partial")
+    text, _, _ = extract_rewrite('{"modified_text": "cut off \\uXY')
+    assert text == "cut off"
+
+
+@pytest.mark.parametrize("raw, outcome", [
+    ('{"modified_text": "Simple.", "keywords": ["a", "b"]}', "json"),
+    ('Here you go:\n```json\n{"modified_text": "Simple.", "keywords": ["a", "b"]}\n```', "fenced"),
+    ("{'modified_text': 'Simple.', 'keywords': ['a', 'b'],}", "json"),
+    ('{"modified_text": "Simple.", "keywords": ["a", "b"', "repaired"),
+])
+def test_salvaged_replies(raw, outcome):
+    assert extract_rewrite(raw) == ("Simple.", ["a", "b"], outcome)
+
+
+@pytest.mark.parametrize("raw", [
+    "I'm sorry, I can't help with that.",
+    "Here is a simpler version of your text, with shorter sentences.",
+    "```\nSure! Let me know if you need anything else.\n```",
+    "",
+])
+def test_replies_without_json_fail(raw):
+    assert extract_rewrite(raw) == (None, [], "failed")
+
+
+def test_modified_text_without_braces_is_salvaged():
+    assert extract_rewrite('"modified_text": "Simple.", "keywords": ["a"]') == ("Simple.", ["a"], "repaired")
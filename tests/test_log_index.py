@@ -0,0 +1,76 @@
+import csv
+import io
+
+from log_index import LogIndex
+
+HEADERS = ["Timestamp", "Project Name", "User Email", "Text"]
+
+
+def csv_bytes(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def texts(rows):
+    return [row["Text"] for row in rows]
+
+
+def test_lookup_groups_rows_by_user_and_project(tmp_path):
+    index = LogIndex(str(tmp_path / "log.csv"), HEADERS)
+    index.append(["t1", "P", "A@b.c", 'multi\nline, "quoted"'])
+    index.append(["t2", "Q", "a@b.c", "other project"])
+    index.append_many([["t3", "P", "a@B.c", "second"], ["t4", "P", "x@y.z", "other user"]])
+    assert texts(index.lookup("a@b.c", "P")) == ['multi\nline, "quoted"', "second"]
+    # A fresh index (another worker) reads the same sidecar
+    assert texts(LogIndex(index.csv_path, HEADERS).lookup("A@B.C", "Q")) == ["other project"]
+
+
+def test_lookup_never_modifies_an_unterminated_log(tmp_path):
+    path = tmp_path / "log.csv"
+    # Last row complete but with no final newline, as a spreadsheet might save it
+    data = csv_bytes([HEADERS, ["t1", "P", "a@b.c", "first"]]) + b"t2,P,a@b.c,last row"
+    path.write_bytes(data)
+    index = LogIndex(str(path), HEADERS)
+    assert texts(index.lookup("a@b.c", "P")) == ["first"]
+    assert path.read_bytes() == data
+    # The next append gives the row its line ending instead of dropping it
+    index.append(["t3", "P", "a@b.c", "appended"])
+    assert texts(index.lookup("a@b.c", "P")) == ["first", "last row", "appended"]
+    assert texts(LogIndex(str(path), HEADERS).lookup("a@b.c", "P")) == ["first", "last row", "appended"]
+
+
+def test_torn_row_is_only_cut_off_by_an_append(tmp_path):
+    path = tmp_path / "log.csv"
+    data = csv_bytes([HEADERS, ["t1", "P", "a@b.c", "first"]]) + b't2,P,a@b.c,"cut off mid'
+    path.write_bytes(data)
+    index = LogIndex(str(path), HEADERS)
+    assert texts(index.lookup("a@b.c", "P")) == ["first"]
+    assert path.read_bytes() == data
+    index.append(["t3", "P", "a@b.c", "after crash"])
+    assert texts(index.lookup("a@b.c", "P")) == ["first", "after crash"]
+    rows = list(csv.reader(io.StringIO(path.read_text(encoding="utf-8"))))
+    assert [row[3] for row in rows[1:]] == ["first", "after crash"]
+
+
+def test_index_recovers_from_torn_or_stale_sidecar(tmp_path):
+    path = tmp_path / "log.csv"
+    index = LogIndex(str(path), HEADERS)
+    index.append_many([["t1", "P", "a@b.c", "one"], ["t2", "P", "a@b.c", "two"]])
+    with open(index.index_path, "ab") as f:
+        f.write(b"12\t3")
+    assert texts(LogIndex(str(path), HEADERS).lookup("a@b.c", "P")) == ["one", "two"]
+    # The log is replaced by a shorter one: the index is rebuilt from it
+    path.write_bytes(csv_bytes([HEADERS, ["t9", "P", "a@b.c", "new"]]))
+    assert texts(index.lookup("a@b.c", "P")) == ["new"]
+
+
+def test_rows_swapped_in_place_are_not_returned_to_the_wrong_user(tmp_path):
+    path = tmp_path / "log.csv"
+    index = LogIndex(str(path), HEADERS)
+    index.append_many([["t1", "P", "a@b.c", "mine"], ["t2", "P", "x@y.z", "hers"]])
+    assert texts(index.lookup("a@b.c", "P")) == ["mine"]
+    # Same size, rows in the other order: the index's offsets now point at each other's rows
+    path.write_bytes(csv_bytes([HEADERS, ["t2", "P", "x@y.z", "hers"], ["t1", "P", "a@b.c", "mine"]]))
+    assert texts(index.lookup("a@b.c", "P")) == ["mine"]
+    assert texts(index.lookup("x@y.z", "P")) == ["hers"]
@@ -0,0 +1,72 @@
+import logging
+import threading
+import time
+
+from log_writer import BatchedLogWriter
+
+
+def test_rows_are_written_in_batches():
+    written = []
+    writer = BatchedLogWriter(lambda rows: written.append(list(rows)), max_batch=50, linger=0.05)
+    for i in range(120):
+        writer.submit(i)
+    assert writer.wait_idle(5)
+    assert [row for batch in written for row in batch] == list(range(120))
+    assert len(written) < 120 and max(len(batch) for batch in written) <= 50
+    stats = writer.stats()
+    assert (stats["submitted"], stats["written"], stats["batches"]) == (120, 120, len(written))
+    assert writer.close(5)
+
+
+def test_close_gives_up_on_a_stalled_writer(caplog):
+    release = threading.Event()
+    writer = BatchedLogWriter(lambda rows: release.wait(), max_queue=2, max_batch=1, linger=0)
+    writer.submit("in flight")
+    time.sleep(0.1)
+    writer.submit("queued 1")
+    writer.submit("queued 2")
+    start = time.monotonic()
+    with caplog.at_level(logging.ERROR, logger="log_writer"):
+        assert writer.close(0.3) is False
+    assert time.monotonic() - start < 2
+    assert "3 rows not written" in caplog.text
+    release.set()
+
+
+def test_stats_are_logged_periodically(caplog):
+    release = threading.Event()
+    writer = BatchedLogWriter(lambda rows: release.wait(), max_queue=1, max_batch=1, linger=0,
+                              stats_interval=0.05)
+    with caplog.at_level(logging.INFO, logger="log_writer"):
+        writer.submit(1)
+        time.sleep(0.05)
+        writer.submit(2)
+        threading.Timer(0.1, release.set).start()
+        writer.submit(3)  # waits for room: backpressure
+        assert writer.wait_idle(5)
+        time.sleep(0.2)
+    records = [r for r in caplog.records if r.getMessage().startswith("Log writer stats")]
+    assert records and any(r.levelno == logging.WARNING for r in records)
+    assert writer.stats()["blocked"] == 1
+    assert writer.close(5)
+
+
+def test_a_failing_row_is_dropped_alone(monkeypatch, caplog):
+    monkeypatch.setattr("log_writer.LOG_WRITE_ATTEMPTS", 1)
+    written = []
+
+    def write_batch(rows):
+        if "bad" in rows:
+            raise ValueError("can't store this row")
+        written.extend(rows)
+
+    writer = BatchedLogWriter(write_batch, max_batch=10, linger=0.2)
+    with caplog.at_level(logging.ERROR, logger="log_writer"):
+        for row in ["one", "bad", "two"]:
+            writer.submit(row)
+        assert writer.wait_idle(5)
+    assert written == ["one", "two"]
+    stats = writer.stats()
+    assert (stats["written"], stats["failed"]) == (2, 1)
+    assert "Dropping 1 of 3 log rows" in caplog.text
+    assert writer.close(5)
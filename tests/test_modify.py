@@ -0,0 +1,166 @@
+import json
+import threading
+import time
+
+import pytest
+
+SENTENCES = " ".join(f"Sentence {i} of the long paragraph says something fairly ordinary." for i in range(140))
+LONG_TEXT = "A short opening paragraph.\n\n" + SENTENCES + "\n\nA closing paragraph."
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    # The app reads its settings and opens its stores at import time, so it's
+    # imported inside a scratch directory with in-memory caches
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("REWRITE_CACHE_DB", "")
+    monkeypatch.setenv("MODIFY_JOBS_DB", str(tmp_path / "jobs.db"))
+    import app
+    import csv_logger
+    monkeypatch.setattr(csv_logger, "LOG_BACKEND", "csv")
+    monkeypatch.setattr(csv_logger, "LOG_ASYNC", False)
+    app.rewrite_cache.clear()
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session["user_email"] = "tester@example.com"
+    return client
+
+
+def fake_model(monkeypatch, app_module, reply):
+    # reply(input_text) -> raw model output, for both complete() and stream()
+    def input_text(messages):
+        # The rewrite prompt, also when solver corrections follow it
+        prompt = next(m["content"] for m in messages if "Input:\n" in m["content"])
+        return prompt.split("Input:\n", 1)[1]
+
+    monkeypatch.setattr(app_module.llm, "complete", lambda messages, *args, **kwargs: [reply(input_text(messages))])
+    monkeypatch.setattr(app_module.llm, "stream", lambda messages, *args, **kwargs: iter([reply(input_text(messages))]))
+
+
+def sse_done(response):
+    events = response.get_data(as_text=True).split("\n\n")
+    done = [e for e in events if e.startswith("event: done")]
+    assert done, events
+    return json.loads(done[0].split("data: ", 1)[1])
+
+
+def test_chunked_rewrite_keeps_paragraph_structure(client, app_module, monkeypatch):
+    fake_model(monkeypatch, app_module, lambda text: json.dumps({"modified_text": text, "keywords": ["k"]}))
+    body = {"text": LONG_TEXT, "cache": "bypass"}
+    data = client.post("/modify", json=body).get_json()
+    assert data["chunkCount"] > 2
+    assert data["modifiedText"] == LONG_TEXT
+    assert data["modifiedMetrics"]["paragraphCount"] == 3
+    assert sse_done(client.post("/modify/stream", json=body))["modifiedText"] == LONG_TEXT
+
+
+def test_unparsable_chunks_fall_back_to_the_original(client, app_module, monkeypatch):
+    fake_model(monkeypatch, app_module, lambda text: "")
+    data = client.post("/modify", json={"text": LONG_TEXT, "cache": "bypass"}).get_json()
+    assert data["modifiedText"] == LONG_TEXT
+
+
+def test_malformed_unicode_escape_in_reply(client, app_module, monkeypatch):
+    fake_model(monkeypatch, app_module, lambda text: '{"modified_text": "bad \\uXYZW text", "keywords": []}')
+    body = {"text": "Some text to rewrite.", "cache": "bypass"}
+    response = client.post("/modify", json=body)
+    assert response.status_code == 200
+    assert response.get_json()["modifiedText"] == "bad \\uXYZW text"
+    assert sse_done(client.post("/modify/stream", json=body))["modifiedText"] == "bad \\uXYZW text"
+
+
+def test_refusal_keeps_the_original_text(client, app_module, monkeypatch):
+    fake_model(monkeypatch, app_module, lambda text: "I'm sorry, I can't help with that.")
+    body = {"text": "Some text to rewrite.", "cache": "bypass"}
+    assert client.post("/modify", json=body).get_json()["modifiedText"] == "Some text to rewrite."
+    assert sse_done(client.post("/modify/stream", json=body))["modifiedText"] == "Some text to rewrite."
+
+
+def test_upload_reads_a_urlencoded_body_as_text(client):
+    # What curl --data-binary @file.txt sends: the document under a form Content-Type
+    text = "Some plain text. It has two sentences & an ampersand=sign."
+    response = client.post("/analyze/upload?fields=wordCount,sentenceCount", data=text.encode("utf-8"),
+                           content_type="application/x-www-form-urlencoded")
+    assert response.status_code == 200
+    assert response.get_json() == {"wordCount": 10, "sentenceCount": 2}
+
+
+@pytest.mark.parametrize("path,extra", [("/modify", {}), ("/modify/stream", {}), ("/modify", {"solve": True})])
+def test_unusable_replies_are_not_cached(client, app_module, monkeypatch, path, extra):
+    body = dict({"text": "Some text to rewrite."}, **extra)
+
+    def post():
+        response = client.post(path, json=body)
+        return sse_done(response) if path.endswith("stream") else response.get_json()
+
+    fake_model(monkeypatch, app_module, lambda text: "I'm sorry, I can't help with that.")
+    assert post()["modifiedText"] == "Some text to rewrite."
+    fake_model(monkeypatch, app_module, lambda text: json.dumps({"modified_text": "Rewritten.", "keywords": []}))
+    data = post()
+    assert data["modifiedText"] == "Rewritten."
+    assert data["cached"] is False
+    assert post()["cached"] is True
+
+
+def test_streams_share_an_identical_rewrite_in_flight(app_module, monkeypatch):
+    # A second stream, and a plain /modify, for the same rewrite wait on the first
+    # stream's call and get its result as one piece
+    release = threading.Event()
+    calls = []
+
+    def stream(messages, *args, **kwargs):
+        calls.append(kwargs.get("user"))
+        yield '{"modified_text": "Re'
+        release.wait(5)
+        yield 'written.", "keywords": []}'
+
+    monkeypatch.setattr(app_module.llm, "stream", stream)
+    params, _ = app_module.prepare_modify({"text": "Some text to rewrite."})
+    params["user_email"] = "b@example.com"
+    chunk = params["chunks"][0]
+    leader = app_module.stream_chunk(chunk, False, "a@example.com")
+    assert next(leader) == "Re"
+    joined = []
+    threads = [
+        threading.Thread(target=lambda: joined.append(list(app_module.stream_chunk(chunk, False, "b@example.com")))),
+        threading.Thread(target=lambda: joined.append(app_module.rewrite_chunk(chunk, params))),
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    release.set()
+    rest = list(leader)
+    for thread in threads:
+        thread.join(5)
+    raw_text = rest[-1][0]
+    assert rest == ["written.", (raw_text, False)]
+    assert sorted(joined, key=len) == [[(raw_text, True)], (raw_text, True, None)]
+    assert calls == ["a@example.com"]
+
+
+def test_abandoned_stream_hands_the_rewrite_to_a_waiter(app_module, monkeypatch):
+    calls = []
+
+    def stream(messages, *args, **kwargs):
+        calls.append(kwargs.get("user"))
+        yield '{"modified_text": "Rewritten.", "keywords": []}'
+
+    monkeypatch.setattr(app_module.llm, "stream", stream)
+    params, _ = app_module.prepare_modify({"text": "Some text to rewrite."})
+    chunk = params["chunks"][0]
+    leader = app_module.stream_chunk(chunk, True, "a@example.com")
+    assert next(leader) == "Rewritten."
+    joined = []
+    waiter = threading.Thread(target=lambda: joined.append(list(app_module.stream_chunk(chunk, True, "b@example.com"))))
+    waiter.start()
+    time.sleep(0.2)
+    leader.close()
+    waiter.join(5)
+    assert joined[0][-1][1] is False
+    assert calls == ["a@example.com", "b@example.com"]
@@ -0,0 +1,53 @@
+from rewrite_chunks import estimate_tokens, split_rewrite_chunks
+
+
+def reassemble(chunks):
+    return "".join(separator + chunk for chunk, separator in chunks)
+
+
+def test_short_text_is_one_chunk():
+    text = "  Short text.\n\nTwo paragraphs.  "
+    assert split_rewrite_chunks(text, max_tokens=100) == [(text, "")]
+
+
+def test_paragraphs_are_grouped_and_separators_kept():
+    paragraphs = [f"Paragraph {i} has a few words in it." for i in range(12)]
+    text = "\n\n".join(paragraphs[:6]) + "\n\n\n" + "\n\n".join(paragraphs[6:])
+    chunks = split_rewrite_chunks(text, max_tokens=30)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 30 for chunk, _ in chunks)
+    assert chunks[0][1] == ""
+    assert all(separator.strip() == "" and "\n\n" in separator for _, separator in chunks[1:])
+    assert reassemble(chunks) == text
+
+
+def test_long_paragraph_is_cut_between_sentences_not_into_paragraphs():
+    sentences = [f"Sentence number {i} is here." for i in range(40)]
+    paragraph = " ".join(sentences[:20]) + "\n" + " ".join(sentences[20:])
+    text = "Intro paragraph.\n\n" + paragraph + "\n\nOutro paragraph."
+    chunks = split_rewrite_chunks(text, max_tokens=50)
+    assert reassemble(chunks) == text
+    separators = [separator for _, separator in chunks[1:]]
+    # Pieces of the one long paragraph rejoin with the whitespace between its sentences
+    assert " " in separators
+    assert separators.count("\n\n") <= 2
+    for chunk, _ in chunks:
+        assert not chunk.startswith(" ") and not chunk.endswith(" ")
+
+
+def test_oversized_sentence_is_sent_whole():
+    sentence = "word " * 200 + "end."
+    chunks = split_rewrite_chunks("Short one. " + sentence, max_tokens=50)
+    assert [chunk for chunk, _ in chunks] == ["Short one.", sentence.strip()]
+    assert chunks[1][1] == " "
+
+
+def test_whitespace_around_paragraphs_is_kept_in_the_separators():
+    sentences = " ".join(f"Sentence number {i} is here." for i in range(40))
+    text = "\n  Intro paragraph.  \n\n" + sentences + "   \n\n\tIndented outro. \n"
+    chunks = split_rewrite_chunks(text, max_tokens=50)
+    assert reassemble(chunks) == text
+    assert chunks[0][1] == "\n  "
+    assert chunks[-1][0].endswith("outro. \n")
+    for chunk, _ in chunks[:-1]:
+        assert chunk == chunk.strip()
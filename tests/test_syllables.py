@@ -0,0 +1,68 @@
+import json
+import multiprocessing
+import os
+
+from syllables import SyllableCache, open_syllable_dictionary, write_syllable_dictionary
+
+
+def test_dictionary_lookup(tmp_path):
+    path = str(tmp_path / "syllables.bin")
+    write_syllable_dictionary({"readable": 3, "text": 1, "naïve": 2}, path)
+    dictionary = open_syllable_dictionary(path)
+    assert [dictionary.get(w) for w in ("readable", "text", "naïve", "missing")] == [3, 1, 2, None]
+    assert SyllableCache(dictionary=dictionary).get("missing") > 0
+
+
+def test_snapshot_is_tied_to_the_dictionary_build(tmp_path):
+    path = str(tmp_path / "syllables.bin")
+    snapshot = str(tmp_path / "snapshot.json")
+    write_syllable_dictionary({"readable": 3}, path)
+    cache = SyllableCache(dictionary=open_syllable_dictionary(path))
+    assert cache.get("readable") != 9
+    cache.dump(snapshot)
+
+    same = SyllableCache(dictionary=open_syllable_dictionary(path))
+    assert same.load(snapshot) == 1
+
+    # A rebuilt dictionary must win over counts cached from the old one
+    write_syllable_dictionary({"readable": 4, "other": 2}, path)
+    os.utime(path, ns=(1, 1))
+    rebuilt = SyllableCache(dictionary=open_syllable_dictionary(path))
+    assert rebuilt.load(snapshot) == 0
+    assert rebuilt.get("readable") == 4
+    assert SyllableCache().load(snapshot) == 0
+
+
+def test_unversioned_snapshot_is_ignored(tmp_path):
+    snapshot = tmp_path / "snapshot.json"
+    snapshot.write_text(json.dumps({"readable": 9}))
+    cache = SyllableCache()
+    assert cache.load(str(snapshot)) == 0
+    assert cache.get("readable") != 9
+
+
+def test_unreadable_snapshot_is_a_cold_cache(tmp_path):
+    cache = SyllableCache()
+    assert cache.load(str(tmp_path / "missing.json")) == 0
+    for content in ['{"dictionary": "textstat", "entries": {"a": 1', "not json", '["a"]',
+                    '{"dictionary": "textstat", "entries": {"a": "x"}}', '{"dictionary": "textstat", "entries": 3}']:
+        snapshot = tmp_path / "snapshot.json"
+        snapshot.write_text(content)
+        assert cache.load(str(snapshot)) == 0
+    assert cache.stats()["size"] == 0
+
+
+def test_concurrent_dumps_leave_a_valid_snapshot(tmp_path):
+    path = str(tmp_path / "snapshot.json")
+    cache = SyllableCache()
+    for i in range(2000):
+        cache._put(f"word{i}", 2)
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=cache.dump, args=(path,)) for _ in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    assert [worker.exitcode for worker in workers] == [0] * 8
+    assert SyllableCache().load(path) == 2000
+    assert os.listdir(tmp_path) == ["snapshot.json"]
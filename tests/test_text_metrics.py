@@ -0,0 +1,97 @@
+import json
+import os
+
+import pytest
+
+import batch_metrics
+import text_metrics
+from syllables import syllable_cache
+
+# Texts from the logged CSVs (plus a few edge cases) with the metrics the original
+# textstat-based calculate_text_metrics produced for them
+with open(os.path.join(os.path.dirname(__file__), "golden_metrics.json"), encoding="utf-8") as f:
+    GOLDEN = json.load(f)
+
+
+def normalized(metrics):
+    # topWords pairs are tuples in memory and lists in JSON
+    return json.loads(json.dumps(metrics))
+
+
+@pytest.fixture(autouse=True)
+def textstat_syllables():
+    # The golden values use textstat's syllable counts, not a compiled syllables.bin
+    dictionary = syllable_cache.dictionary
+    syllable_cache.dictionary = None
+    syllable_cache.clear()
+    text_metrics.paragraph_cache.clear()
+    yield
+    syllable_cache.dictionary = dictionary
+    syllable_cache.clear()
+
+
+@pytest.mark.parametrize("case", GOLDEN, ids=range(len(GOLDEN)))
+def test_scalar(case):
+    assert normalized(text_metrics.calculate_text_metrics(case["text"])) == case["metrics"]
+
+
+@pytest.mark.parametrize("case", GOLDEN, ids=range(len(GOLDEN)))
+def test_field_subsets(case):
+    for name in text_metrics.METRIC_NAMES:
+        assert normalized(text_metrics.calculate_text_metrics(case["text"], [name])) == {name: case["metrics"][name]}
+    fields = ["readingEase", "fleschKincaid", "wordCount"]
+    assert normalized(text_metrics.calculate_text_metrics(case["text"], fields)) == \
+        {name: case["metrics"][name] for name in fields}
+
+
+@pytest.mark.parametrize("case", GOLDEN, ids=range(len(GOLDEN)))
+def test_incremental(case):
+    # Twice: the second run takes every paragraph from the cache
+    for _ in range(2):
+        assert normalized(text_metrics.calculate_text_metrics_incremental(case["text"])) == case["metrics"]
+
+
+@pytest.mark.parametrize("case", GOLDEN, ids=range(len(GOLDEN)))
+@pytest.mark.parametrize("size", [1, 7, 4096])
+def test_streaming(case, size):
+    text = case["text"]
+    chunks = (text[i:i + size] for i in range(0, len(text), size))
+    assert normalized(text_metrics.stream_text_metrics(chunks)) == case["metrics"]
+
+
+def test_streaming_cuts_long_paragraphs():
+    # Longer than STREAM_PIECE_CHARS with no paragraph break, so pieces are cut at spaces
+    text = " ".join(case["text"].replace("\n", " ") for case in GOLDEN) * 20
+    assert len(text) > text_metrics.STREAM_PIECE_CHARS
+    chunks = (text[i:i + 1000] for i in range(0, len(text), 1000))
+    assert normalized(text_metrics.stream_text_metrics(chunks)) == normalized(text_metrics.calculate_text_metrics(text))
+
+
+def test_batch():
+    results = batch_metrics.calculate_text_metrics_batch([case["text"] for case in GOLDEN])
+    assert [normalized(metrics) for metrics in results] == [case["metrics"] for case in GOLDEN]
+
+
+def test_analyze_chunk_keeps_order_and_rejects_empty():
+    texts = [GOLDEN[0]["text"], "", GOLDEN[1]["text"], None]
+    results = batch_metrics.analyze_chunk(texts)
+    assert normalized(results[0]["metrics"]) == GOLDEN[0]["metrics"]
+    assert results[1] == {"error": batch_metrics.EMPTY_TEXT_ERROR}
+    assert normalized(results[2]["metrics"]) == GOLDEN[1]["metrics"]
+    assert results[3] == {"error": batch_metrics.EMPTY_TEXT_ERROR}
+
+
+def test_analyze_texts_through_the_process_pool(monkeypatch):
+    monkeypatch.setattr(batch_metrics, "ANALYZE_WORKERS", 2)
+    batch_metrics._reset_pool()
+    try:
+        results = batch_metrics.analyze_texts([case["text"] for case in GOLDEN] + [""])
+        assert batch_metrics._get_pool()._mp_context.get_start_method() != "fork"
+    finally:
+        batch_metrics._reset_pool()
+    # Workers count syllables with whatever dictionary they open, so compare the
+    # fields that don't depend on it
+    assert results[-1] == {"error": batch_metrics.EMPTY_TEXT_ERROR}
+    for case, result in zip(GOLDEN, results):
+        assert result["metrics"]["wordCount"] == case["metrics"]["wordCount"]
+        assert result["metrics"]["sentenceCount"] == case["metrics"]["sentenceCount"]
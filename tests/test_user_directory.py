@@ -0,0 +1,69 @@
+import csv
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import csv_logger
+from user_directory import UserDirectory
+
+
+@pytest.fixture
+def users(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    directory = UserDirectory(csv_logger.USERS_CSV)
+    monkeypatch.setattr(csv_logger, "users", directory)
+    return directory
+
+
+def write_users(rows):
+    with open(csv_logger.USERS_CSV, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Timestamp", "Email", "Password"])
+        writer.writerows(rows)
+
+
+def test_register_and_validate(users):
+    assert not csv_logger.validate_user("a@b.c", "pw")
+    assert csv_logger.register_user("A@b.c", "pw")
+    assert not csv_logger.register_user("a@B.C", "other")
+    assert csv_logger.validate_user("a@b.c", "pw")
+    assert not csv_logger.validate_user("a@b.c", "other")
+    loads = users.loads
+    for _ in range(100):
+        users.get_hashes("a@b.c")
+    assert users.loads == loads
+
+
+def test_duplicate_rows_accept_any_of_their_passwords(users):
+    # Possible in files written before registrations were locked
+    write_users([["t1", "dup@b.c", generate_password_hash("old")],
+                 ["t2", "DUP@b.c", generate_password_hash("new")]])
+    assert csv_logger.validate_user("dup@b.c", "old")
+    assert csv_logger.validate_user("dup@b.c", "new")
+    assert not csv_logger.validate_user("dup@b.c", "neither")
+    assert not csv_logger.register_user("dup@b.c", "again")
+
+
+def test_file_changes_are_picked_up(users):
+    write_users([["t1", "a@b.c", generate_password_hash("pw")]])
+    assert csv_logger.validate_user("a@b.c", "pw")
+    # Another worker registers someone
+    with open(csv_logger.USERS_CSV, "a", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerow(["t2", "z@b.c", generate_password_hash("zz")])
+    assert csv_logger.validate_user("z@b.c", "zz")
+    assert not csv_logger.register_user("z@b.c", "zz")
+
+
+def test_concurrent_registrations_of_one_email(users, monkeypatch):
+    monkeypatch.setattr(csv_logger, "generate_password_hash", lambda password: "hash:" + password)
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(csv_logger.register_user("race@b.c", str(i))))
+               for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 1
+    with open(csv_logger.USERS_CSV, newline="", encoding="utf-8") as f:
+        assert [row["Email"] for row in csv.DictReader(f)] == ["race@b.c"]
@@ -0,0 +1,592 @@
+import os
+import re
+from collections import Counter
+from itertools import accumulate
+from textstat import syllable_count
+from textstat.textstat import legacy_round
+from syllables import PUNCTUATION_RE, normalize_word, syllable_cache
+from result_cache import ResultCache, content_key
+
+# Bump whenever a metric definition changes so cached results are not reused
+METRICS_VERSION = "1"
+# Same boundary textstat.sentence_count splits on (used by the Flesch scores)
+TS_SENTENCE_RE = re.compile(r' *[\.\?!][\'"\)\]]*[ |\n](?=[A-Z])')
+PARAGRAPH_SEPARATOR = "\n\n"
+WORD_RE = re.compile(r'\S+')
+# Characters that take two UTF-16 code units (two JavaScript string indices)
+ASTRAL_RE = re.compile('[\U00010000-\U0010FFFF]')
+# Words with more syllables than this are marked in annotations
+ANNOTATION_SYLLABLE_THRESHOLD = 3
+# Paragraph aggregates reused by calculate_text_metrics_incremental, keyed by paragraph hash
+paragraph_cache = ResultCache("paragraph_primitives", int(os.environ.get("PARAGRAPH_CACHE_SIZE", "4096")))
+
+
+def get_reading_ease_descriptor(reading_ease):
+    if reading_ease >= 90:
+        return "Very Easy (Easily understood by an 11-year-old, simple language)"
+    elif reading_ease >= 80:
+        return "Easy (Conversational English, good for younger audiences)"
+    elif reading_ease >= 70:
+        return "Fairly Easy (Standard reading level, easily understood by teenagers)"
+    elif reading_ease >= 60:
+        return "Standard (Plain English, suitable for most readers)"
+    elif reading_ease >= 50:
+        return "Fairly Difficult (Somewhat challenging, college-level text)"
+    elif reading_ease >= 30:
+        return "Difficult (Best for academics and professionals, complex text)"
+    else:
+        return "Very Difficult (Extremely complex, suitable for specialists)"
+
+
+def get_readability_descriptor(fk_grade):
+    if fk_grade <= 5:
+        return "Very Easy (5th grade or below, easily understood by an 11-year-old)"
+    elif fk_grade <= 8:
+        return "Easy (6th-8th grade, fairly easy to read)"
+    elif fk_grade <= 10:
+        return "Standard (9th-10th grade, moderately challenging)"
+    elif fk_grade <= 12:
+        return "Fairly Difficult (11th-12th grade, college level)"
+    elif fk_grade <= 15:
+        return "Difficult (College level, requires advanced reading skills)"
+    else:
+        return "Very Difficult (Postgraduate level, highly academic)"
+
+
+def word_syllables(normalized):
+    # Syllables of an already normalized word, 0 for an empty one (textstat semantics)
+    return syllable_cache.get(normalized) if normalized else 0
+
+
+def word_features(word):
+    # (lowercase form, syllables, letter count, counts towards textstat's lexicon)
+    lower = word.lower()
+    normalized = PUNCTUATION_RE.sub('', lower)
+    return lower, word_syllables(normalized), sum(c.isalpha() for c in word), bool(normalized)
+
+
+def _word_stats(word_counts):
+    # Per-unique-word aggregation of a Counter of whitespace tokens
+    frequency = {}
+    syllables_by_word = {}
+    letters = lexicon = three_syllables = over_four_syllables = over_twelve_letters = 0
+    for word, count in word_counts.items():
+        lower, word_syll, word_letters, is_lexical = word_features(word)
+        syllables_by_word[word] = word_syll
+        frequency[lower] = frequency.get(lower, 0) + count
+        letters += count * word_letters
+        if is_lexical:
+            lexicon += count
+        if word_syll == 3:
+            three_syllables += count
+        elif word_syll > 4:
+            over_four_syllables += count
+        if len(word) > 12:
+            over_twelve_letters += count
+    stats = {
+        "letters": letters,
+        "words": sum(word_counts.values()),
+        "lexicon": lexicon,
+        "threeSyllableWords": three_syllables,
+        "overFourSyllableWords": over_four_syllables,
+        "overTwelveLetterWords": over_twelve_letters,
+        "frequency": frequency,
+    }
+    return stats, syllables_by_word
+
+
+def _token_syllables(token, syllables_by_word):
+    # textstat counts len(hyphenation positions) + 1 for every ' '-separated token,
+    # including empty and punctuation-only ones
+    count = syllables_by_word.get(token)
+    if count is None:
+        # Empty or newline-joined token; not worth a slot in the shared cache
+        count = syllable_count(normalize_word(token))
+    return count or 1
+
+
+def _has_syllables(text, word_counts, lexicon):
+    # textstat returns 0 syllables for text that is nothing but punctuation
+    return bool(lexicon or (text and word_counts.get(text) != 1))
+
+
+def tokenize(text):
+    # Splits the text once into each kind of piece the metrics need and aggregates
+    # per unique word, so syllables are looked up once per distinct word.
+    # Words are whitespace tokens (str.split), sentences are '.'-separated pieces and
+    # paragraphs are '\n\n'-separated pieces. Syllables and the sentence count used by
+    # the Flesch scores follow textstat exactly, so the scores match textstat's.
+    word_counts = Counter(text.split())
+    primitives, syllables_by_word = _word_stats(word_counts)
+
+    syllables = 0
+    if _has_syllables(text, word_counts, primitives["lexicon"]):
+        for token, count in Counter(text.split(' ')).items():
+            syllables += count * _token_syllables(token, syllables_by_word)
+
+    ts_pieces = TS_SENTENCE_RE.split(text)
+    ts_ignored = sum(1 for piece in ts_pieces if _ts_lexicon(piece) <= 2)
+
+    primitives.update(tokenize_sentences(text))
+    primitives.update({
+        "syllables": syllables,
+        "paragraphs": _count_paragraphs(text),
+        "tsSentences": max(1, len(ts_pieces) - ts_ignored),
+    })
+    return primitives
+
+
+def tokenize_sentences(text):
+    # '.'-separated sentences: how many are non-blank and the one with the most words
+    sentences = longest_words = 0
+    longest_sentence = ""
+    for piece in text.split('.'):
+        piece_words = len(piece.split())
+        if piece_words:
+            sentences += 1
+            if piece_words > longest_words:
+                longest_words = piece_words
+                longest_sentence = piece
+    return {"sentences": sentences, "longestSentence": longest_sentence.strip()}
+
+
+def _count_paragraphs(text):
+    return sum(1 for piece in text.split(PARAGRAPH_SEPARATOR) if not piece.isspace() and piece)
+
+
+def _ts_lexicon(piece):
+    # textstat.lexicon_count
+    return len(PUNCTUATION_RE.sub('', piece).split())
+
+
+# Only these primitives are plain sums over pieces; the rest are merged below
+ADDITIVE_PRIMITIVES = (
+    "letters", "words", "lexicon", "threeSyllableWords", "overFourSyllableWords",
+    "overTwelveLetterWords",
+)
+
+
+def paragraph_primitives(paragraph):
+    # Primitives of one '\n\n'-separated piece (or a part of one, see PrimitiveMerger).
+    # The '.'-sentence, ' '-token and textstat sentence at either edge can continue
+    # into the neighbouring pieces, so their partial state is kept as head/tail.
+    word_counts = Counter(paragraph.split())
+    primitives, syllables_by_word = _word_stats(word_counts)
+    # 1 when the piece is not blank; PrimitiveMerger turns this into a paragraph count
+    primitives["paragraphs"] = 0 if paragraph.isspace() or not paragraph else 1
+    primitives["hasSyllables"] = _has_syllables(paragraph, word_counts, primitives["lexicon"])
+
+    tokens = paragraph.split(' ')
+    primitives["tokenSplit"] = len(tokens) > 1
+    primitives["tokenHead"] = tokens[0]
+    primitives["tokenHeadSyllables"] = _token_syllables(tokens[0], syllables_by_word)
+    primitives["tokenTail"] = tokens[-1]
+    primitives["tokenTailSyllables"] = _token_syllables(tokens[-1], syllables_by_word)
+    primitives["tokenMiddleSyllables"] = sum(
+        count * _token_syllables(token, syllables_by_word)
+        for token, count in Counter(tokens[1:-1]).items())
+
+    pieces = paragraph.split('.')
+    sentences = longest_words = 0
+    longest_sentence = ""
+    for piece in pieces[1:-1]:
+        piece_words = len(piece.split())
+        if piece_words:
+            sentences += 1
+            if piece_words > longest_words:
+                longest_words = piece_words
+                longest_sentence = piece.strip()
+    primitives.update({
+        "sentenceSplit": len(pieces) > 1,
+        "sentenceHead": pieces[0],
+        "sentenceHeadWords": len(pieces[0].split()),
+        "sentenceTail": pieces[-1],
+        "sentenceTailWords": len(pieces[-1].split()),
+        "sentences": sentences,
+        "longestSentenceWords": longest_words,
+        "longestSentence": longest_sentence,
+    })
+
+    ts_lexicon = [_ts_lexicon(piece) for piece in TS_SENTENCE_RE.split(paragraph)]
+    primitives.update({
+        "tsSplit": len(ts_lexicon) > 1,
+        "tsHead": ts_lexicon[0],
+        "tsTail": ts_lexicon[-1],
+        "tsMiddle": max(len(ts_lexicon) - 2, 0),
+        "tsMiddleIgnored": sum(1 for count in ts_lexicon[1:-1] if count <= 2),
+    })
+    return primitives
+
+
+class PrimitiveMerger:
+    # Folds piece primitives, in text order, into what tokenize() returns for the
+    # whole text. Pieces are joined either by PARAGRAPH_SEPARATOR or by a single ' '
+    # that follows an alphanumeric character; no textstat sentence boundary can
+    # touch such a space, so the textstat pieces merge the same way across both.
+
+    def __init__(self):
+        self.primitives = dict.fromkeys(ADDITIVE_PRIMITIVES, 0)
+        self.frequency = {}
+        self.pieces = 0
+        self.single_piece_has_syllables = True
+        self.syllables = 0
+        self.open_token = self.open_token_syllables = None
+        self.paragraphs = 0
+        self.open_paragraph = False
+        self.sentences = self.longest_words = self.open_words = 0
+        self.longest_sentence = ""
+        self.open_parts = []
+        self.ts_pieces = self.ts_ignored = self.open_ts = 0
+
+    def add(self, piece, separator=PARAGRAPH_SEPARATOR):
+        # separator is what joins this piece to the previous one
+        first = not self.pieces
+        self.pieces += 1
+        self.single_piece_has_syllables = piece["hasSyllables"]
+        for key in ADDITIVE_PRIMITIVES:
+            self.primitives[key] += piece[key]
+        frequency = self.frequency
+        for word, count in piece["frequency"].items():
+            frequency[word] = frequency.get(word, 0) + count
+
+        if first or separator == ' ':
+            if not first:
+                self._close_token()
+            self.open_token = piece["tokenHead"]
+            self.open_token_syllables = piece["tokenHeadSyllables"]
+        else:
+            self.open_token = self.open_token + separator + piece["tokenHead"]
+            self.open_token_syllables = None
+        if piece["tokenSplit"]:
+            self._close_token()
+            self.syllables += piece["tokenMiddleSyllables"]
+            self.open_token = piece["tokenTail"]
+            self.open_token_syllables = piece["tokenTailSyllables"]
+
+        if not first and separator == PARAGRAPH_SEPARATOR:
+            self.paragraphs += self.open_paragraph
+            self.open_paragraph = False
+        self.open_paragraph = self.open_paragraph or piece["paragraphs"] > 0
+
+        if not first:
+            self.open_parts.append(separator)
+        self.open_parts.append(piece["sentenceHead"])
+        self.open_words += piece["sentenceHeadWords"]
+        if piece["sentenceSplit"]:
+            self._close_sentence()
+            self.sentences += piece["sentences"]
+            if piece["longestSentenceWords"] > self.longest_words:
+                self.longest_words = piece["longestSentenceWords"]
+                self.longest_sentence = piece["longestSentence"]
+            self.open_parts = [piece["sentenceTail"]]
+            self.open_words = piece["sentenceTailWords"]
+
+        self.open_ts += piece["tsHead"]
+        if piece["tsSplit"]:
+            self.ts_pieces += 1 + piece["tsMiddle"]
+            self.ts_ignored += (self.open_ts <= 2) + piece["tsMiddleIgnored"]
+            self.open_ts = piece["tsTail"]
+
+    def _close_token(self):
+        if self.open_token_syllables is None:
+            self.open_token_syllables = _token_syllables(self.open_token, {})
+        self.syllables += self.open_token_syllables
+
+    def _close_sentence(self):
+        if self.open_words:
+            self.sentences += 1
+            if self.open_words > self.longest_words:
+                self.longest_words = self.open_words
+                self.longest_sentence = "".join(self.open_parts).strip()
+
+    def result(self):
+        self._close_token()
+        self._close_sentence()
+        syllables = self.syllables
+        if self.pieces == 1 and not self.single_piece_has_syllables:
+            syllables = 0
+        primitives = dict(self.primitives)
+        primitives.update({
+            "frequency": self.frequency,
+            "syllables": syllables,
+            "sentences": self.sentences,
+            "longestSentence": self.longest_sentence,
+            "paragraphs": self.paragraphs + self.open_paragraph,
+            "tsSentences": max(1, self.ts_pieces + 1 - self.ts_ignored - (self.open_ts <= 2)),
+        })
+        return primitives
+
+
+def merge_paragraphs(paragraphs):
+    # Rebuilds tokenize(PARAGRAPH_SEPARATOR.join(pieces)) from the pieces' primitives
+    merger = PrimitiveMerger()
+    for paragraph in paragraphs:
+        merger.add(paragraph)
+    return merger.result()
+
+
+def flesch_scores(lexicon, ts_sentences, syllables):
+    # Reproduces textstat's flesch_kincaid_grade / flesch_reading_ease arithmetic
+    sentence_length = legacy_round(float(lexicon / ts_sentences), 1)
+    try:
+        syllables_per_word = legacy_round(float(syllables) / float(lexicon), 1)
+    except ZeroDivisionError:
+        syllables_per_word = 0.0
+    flesch_kincaid = legacy_round(
+        float(0.39 * sentence_length) + float(11.8 * syllables_per_word) - 15.59, 1)
+    reading_ease = legacy_round(
+        206.835 - float(1.015 * sentence_length) - float(84.6 * syllables_per_word), 2)
+    return flesch_kincaid, reading_ease
+
+
+def _sentence_count(p):
+    return p["sentences"] or 1
+
+
+def _paragraph_count(p):
+    return p["paragraphs"] or 1
+
+
+def _per_word(p, key, scale=None):
+    # Ratio of a primitive to the word count, 0 for an empty text
+    words = p["words"]
+    if words <= 0:
+        return 0
+    return round((p[key] / words) * scale, 1) if scale else round(p[key] / words, 1)
+
+
+def _flesch(p):
+    return flesch_scores(p["lexicon"], p["tsSentences"], p["syllables"])
+
+
+FLESCH_PRIMITIVES = ("lexicon", "tsSentences", "syllables")
+
+# Every metric /analyze can return, in response order: (name, primitives it reads, function).
+# Asking for a subset (fields=) only computes the primitives those metrics depend on.
+METRIC_REGISTRY = [
+    ("letterCount", ("letters",), lambda p: p["letters"]),
+    ("sentenceCount", ("sentences",), _sentence_count),
+    ("wordCount", ("words",), lambda p: p["words"]),
+    ("uniqueWordCount", ("frequency",), lambda p: len(p["frequency"])),
+    ("totalSyllables", ("syllables",), lambda p: p["syllables"]),
+    ("avgSyllablesPerWord", ("syllables", "words"), lambda p: _per_word(p, "syllables")),
+    ("wordsThreeSyllables", ("threeSyllableWords",), lambda p: p["threeSyllableWords"]),
+    ("percWordsThreeSyllables", ("threeSyllableWords", "words"),
+     lambda p: _per_word(p, "threeSyllableWords", 100)),
+    ("longestSentence", ("longestSentence",), lambda p: p["longestSentence"]),
+    ("paragraphCount", ("paragraphs",), _paragraph_count),
+    ("avgSpeakingTime", ("words",), lambda p: round(p["words"] / 150, 1) if p["words"] > 0 else 0),
+    ("avgReadingTime", ("words",), lambda p: round(p["words"] / 200, 1) if p["words"] > 0 else 0),
+    ("avgWritingTime", ("words",), lambda p: round(p["words"] / 40, 1) if p["words"] > 0 else 0),
+    ("avgWordsPerSentence", ("words", "sentences"), lambda p: round(p["words"] / _sentence_count(p), 1)),
+    ("avgWordsPerParagraph", ("words", "paragraphs"), lambda p: round(p["words"] / _paragraph_count(p), 1)),
+    ("avgSentencesPerParagraph", ("sentences", "paragraphs"),
+     lambda p: round(_sentence_count(p) / _paragraph_count(p), 1)),
+    ("avgCharactersPerWord", ("letters", "words"), lambda p: _per_word(p, "letters")),
+    ("wordsMoreThan4Syllables", ("overFourSyllableWords",), lambda p: p["overFourSyllableWords"]),
+    ("percWordsMoreThan4Syllables", ("overFourSyllableWords", "words"),
+     lambda p: _per_word(p, "overFourSyllableWords", 100)),
+    ("wordsMoreThan12Letters", ("overTwelveLetterWords",), lambda p: p["overTwelveLetterWords"]),
+    ("percWordsMoreThan12Letters", ("overTwelveLetterWords", "words"),
+     lambda p: _per_word(p, "overTwelveLetterWords", 100)),
+    ("topWords", ("frequency",), lambda p: sorted(p["frequency"].items(), key=lambda x: x[1], reverse=True)[:5]),
+    ("fleschKincaid", FLESCH_PRIMITIVES, lambda p: _flesch(p)[0]),
+    ("readabilityDescriptor", FLESCH_PRIMITIVES, lambda p: get_readability_descriptor(_flesch(p)[0])),
+    ("readingEase", FLESCH_PRIMITIVES, lambda p: _flesch(p)[1]),
+    ("readingEaseDescriptor", FLESCH_PRIMITIVES, lambda p: get_reading_ease_descriptor(_flesch(p)[1])),
+    ("readingTime", ("words",), lambda p: round(p["words"] / 200, 2)),
+    ("averageWordLength", ("letters", "words"), lambda p: _per_word(p, "letters")),
+]
+METRIC_NAMES = [name for name, _, _ in METRIC_REGISTRY]
+
+
+def required_primitives(fields):
+    needed = []
+    for name, dependencies, _ in METRIC_REGISTRY:
+        if name in fields:
+            needed.extend(d for d in dependencies if d not in needed)
+    return needed
+
+
+def derive_metrics(primitives, fields=None):
+    return {
+        name: compute(primitives)
+        for name, _, compute in METRIC_REGISTRY
+        if fields is None or name in fields
+    }
+
+
+def _provide_words(p):
+    if "wordCounts" in p:
+        return {"words": sum(p["wordCounts"].values())}
+    return {"words": len(p.text.split())}
+
+
+def _provide_frequency(p):
+    frequency = {}
+    for word, count in p["wordCounts"].items():
+        lower = word.lower()
+        frequency[lower] = frequency.get(lower, 0) + count
+    return {"frequency": frequency}
+
+
+def _provide_word_syllables(p):
+    return {"wordSyllables": {
+        word: word_syllables(normalize_word(word)) for word in p["wordCounts"]
+    }}
+
+
+def _count_words(p, predicate):
+    return sum(count for word, count in p["wordCounts"].items() if predicate(word))
+
+
+def _provide_syllables(p):
+    syllables = 0
+    if _has_syllables(p.text, p["wordCounts"], p["lexicon"]):
+        syllables_by_word = p["wordSyllables"]
+        for token, count in Counter(p.text.split(' ')).items():
+            syllables += count * _token_syllables(token, syllables_by_word)
+    return {"syllables": syllables}
+
+
+def _provide_ts_sentences(p):
+    ts_pieces = TS_SENTENCE_RE.split(p.text)
+    ts_ignored = sum(1 for piece in ts_pieces if _ts_lexicon(piece) <= 2)
+    return {"tsSentences": max(1, len(ts_pieces) - ts_ignored)}
+
+
+# How LazyPrimitives computes each primitive on its own
+PRIMITIVE_PROVIDERS = {
+    "wordCounts": lambda p: {"wordCounts": Counter(p.text.split())},
+    "words": _provide_words,
+    "letters": lambda p: {"letters": sum(
+        count * sum(c.isalpha() for c in word) for word, count in p["wordCounts"].items())},
+    "lexicon": lambda p: {"lexicon": _count_words(p, lambda word: PUNCTUATION_RE.sub('', word))},
+    "frequency": _provide_frequency,
+    "wordSyllables": _provide_word_syllables,
+    "threeSyllableWords": lambda p: {"threeSyllableWords": _count_words(
+        p, lambda word: p["wordSyllables"][word] == 3)},
+    "overFourSyllableWords": lambda p: {"overFourSyllableWords": _count_words(
+        p, lambda word: p["wordSyllables"][word] > 4)},
+    "overTwelveLetterWords": lambda p: {"overTwelveLetterWords": _count_words(p, lambda word: len(word) > 12)},
+    "syllables": _provide_syllables,
+    "sentences": lambda p: tokenize_sentences(p.text),
+    "longestSentence": lambda p: tokenize_sentences(p.text),
+    "paragraphs": lambda p: {"paragraphs": _count_paragraphs(p.text)},
+    "tsSentences": _provide_ts_sentences,
+}
+
+
+class LazyPrimitives(dict):
+    # Primitives of one text, each computed the first time a metric reads it
+
+    def __init__(self, text):
+        super().__init__()
+        self.text = text
+
+    def __missing__(self, key):
+        self.update(PRIMITIVE_PROVIDERS[key](self))
+        return self[key]
+
+
+def metrics_fingerprint():
+    # Everything besides the text that determines calculate_text_metrics' output
+    return f"{METRICS_VERSION}:{syllable_cache.fingerprint}"
+
+
+def calculate_text_metrics(text, fields=None):
+    # fields limits the result to those metrics and skips primitives none of them need
+    if fields is None:
+        return derive_metrics(tokenize(text))
+    primitives = LazyPrimitives(text)
+    for name in required_primitives(fields):
+        primitives[name]
+    return derive_metrics(primitives, fields)
+
+
+def calculate_text_metrics_incremental(text):
+    # Same result as calculate_text_metrics, but paragraphs already seen (e.g. the
+    # untouched parts of a re-analyzed draft) come from paragraph_cache
+    paragraphs = []
+    for piece in text.split(PARAGRAPH_SEPARATOR):
+        key = content_key(piece)
+        primitives = paragraph_cache.get(key)
+        if primitives is None:
+            primitives = paragraph_primitives(piece)
+            paragraph_cache.set(key, primitives)
+        paragraphs.append(primitives)
+    return derive_metrics(merge_paragraphs(paragraphs))
+
+
+# Longest piece iter_pieces buffers before cutting at a safe space
+STREAM_PIECE_CHARS = 64 * 1024
+
+
+def iter_pieces(chunks, max_chars=STREAM_PIECE_CHARS):
+    # Re-cuts a stream of text chunks into (piece, separator-before-it) pairs at
+    # paragraph breaks, or at a space after an alphanumeric character once a paragraph
+    # grows past max_chars, so only one piece is ever held in memory
+    carry = ""
+    separator = PARAGRAPH_SEPARATOR
+    for chunk in chunks:
+        parts = (carry + chunk).split(PARAGRAPH_SEPARATOR)
+        for part in parts[:-1]:
+            yield part, separator
+            separator = PARAGRAPH_SEPARATOR
+        carry = parts[-1]
+        while len(carry) > max_chars:
+            cut = carry.rfind(' ', 1, max_chars)
+            while cut > 0 and not carry[cut - 1].isalnum():
+                cut = carry.rfind(' ', 1, cut)
+            if cut <= 0:
+                break
+            yield carry[:cut], separator
+            separator = ' '
+            carry = carry[cut + 1:]
+    yield carry, separator
+
+
+def stream_text_metrics(chunks, fields=None):
+    # calculate_text_metrics for text arriving as an iterable of str chunks; keeps the
+    # running aggregates of PrimitiveMerger instead of the text
+    merger = PrimitiveMerger()
+    for piece, separator in iter_pieces(chunks):
+        merger.add(paragraph_primitives(piece), separator)
+    return derive_metrics(merger.result(), fields)
+
+
+def annotate_text(text, syllable_threshold=ANNOTATION_SYLLABLE_THRESHOLD):
+    # Highlighting data for the analyzer page: [start, end, syllables] for every textstat
+    # sentence (the ones the Flesch scores are computed from; together they cover the
+    # whole text) and for every word above syllable_threshold. Syllables are the same
+    # per-word counts the metrics use. Offsets are UTF-16 code units so they can be
+    # used directly as JavaScript string indices.
+    ends = [m.end() for m in TS_SENTENCE_RE.finditer(text)] + [len(text)]
+    syllables_by_word = {}
+    sentences = []
+    words = []
+    index = start = total = 0
+    for m in WORD_RE.finditer(text):
+        while m.start() >= ends[index]:
+            sentences.append([start, ends[index], total])
+            start = ends[index]
+            index += 1
+            total = 0
+        word = m.group()
+        syllables = syllables_by_word.get(word)
+        if syllables is None:
+            syllables = syllables_by_word[word] = word_syllables(normalize_word(word))
+        total += syllables
+        if syllables > syllable_threshold:
+            words.append([m.start(), min(m.end(), ends[index]), syllables])
+    for end in ends[index:]:
+        sentences.append([start, end, total])
+        start = end
+        total = 0
+
+    if ASTRAL_RE.search(text):
+        units = list(accumulate((2 if ord(c) > 0xFFFF else 1 for c in text), initial=0))
+        for span in sentences + words:
+            span[0] = units[span[0]]
+            span[1] = units[span[1]]
+    return {"sentences": sentences, "words": words}
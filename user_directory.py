@@ -0,0 +1,67 @@
+import os
+import csv
+import threading
+from file_lock import locked
+
+_NOT_LOADED = object()
+
+
+class UserDirectory:
+    # Lowercased email -> password hashes, loaded from the users CSV. The CSV stays the
+    # source of truth: each lookup stats it and reloads when its mtime, size or inode
+    # changed (e.g. another worker registered someone or the file was edited), and
+    # this process's own registrations are added in place without a reload.
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self._users = {}
+        # (mtime, size, inode) of the file as loaded; None if it didn't exist
+        self._signature = _NOT_LOADED
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.csv_path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _load(self):
+        # Call with the file locked
+        users = {}
+        if os.path.exists(self.csv_path):
+            with open(self.csv_path, newline='', encoding='utf-8') as csvfile:
+                for row in csv.DictReader(csvfile):
+                    # Every row is kept: files from before registrations were locked
+                    # can hold an email twice, and a password matching any row logs in
+                    users.setdefault(row.get("Email", "").lower(), []).append(row.get("Password", ""))
+        self._users = users
+        self._signature = self._stat_signature()
+        self.loads += 1
+
+    def _refresh(self):
+        if self._stat_signature() == self._signature:
+            return
+        with self._lock:
+            if self._stat_signature() != self._signature:
+                with locked(self.csv_path, shared=True):
+                    self._load()
+
+    def get_hashes(self, email):
+        # The email's password hashes in file order; empty if it isn't registered
+        self._refresh()
+        return list(self._users.get(email.lower(), ()))
+
+    def add(self, email, password_hash, append_row):
+        # Appends the user with append_row() unless the email is taken; returns
+        # whether it was added. The check and the append hold the file lock.
+        with self._lock, locked(self.csv_path):
+            if self._stat_signature() != self._signature:
+                self._load()
+            if email.lower() in self._users:
+                return False
+            append_row()
+            self._users[email.lower()] = [password_hash]
+            self._signature = self._stat_signature()
+        return True